@@ -1,15 +1,57 @@
 #!/usr/bin/env python
-import sys
+"""Extract text from PDFs, text files and (with tesseract) images.
+
+  extract_text.py <file1> [file2 ...]     print {abs_path: text} as JSON
+  extract_text.py --ndjson <files...>     one {path, text, method, ms} line per file
+  extract_text.py --jobs 8 <files...>     same, extracted on 8 worker processes
+  extract_text.py --serve                 JSON-lines requests on stdin
+  extract_text.py --serve --socket PATH   JSON-lines requests on a Unix socket
+
+In server mode pdfminer and pytesseract are imported once and every
+request is pure extraction time. A request is one line, {"path": ...} or
+{"paths": [...]} with an optional "id"; the reply is one line,
+{"id": ..., "text": {abs_path: text}}.
+
+With --jobs N files are fanned out to N worker processes and collected as
+each finishes. A file still running after --timeout seconds has its worker
+killed and replaced and comes back as ''.
+
+Results are cached in NAVI/metadata/extract_cache.sqlite (see
+ExtractCache); --no-cache turns that off, and a location that cannot be
+written only costs a warning.
+
+PDFs are interpreted one page at a time: by default the first 3 pages and
+the last one (--pages), stopping once --max-chars characters are in hand
+or --pdf-seconds have passed.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing as mp
 import os
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+from multiprocessing import connection as mp_connection
 
 # Try to import pdfminer.text
 try:
-    from pdfminer.high_level import extract_text
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
 except Exception:
     # Attempt to install pdfminer.six
     import subprocess
     subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'pdfminer.six'])
-    from pdfminer.high_level import extract_text
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
 
 try:
     import pytesseract
@@ -18,56 +60,583 @@ try:
 except Exception:
     has_tesseract = False
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..', '..', '..'))
+
+# Per-file budget for pool workers, in seconds
+DEFAULT_TIMEOUT = 120.0
+CACHE_FILENAME = 'extract_cache.sqlite'
+DEFAULT_CACHE_MB = 256
+# Outcomes worth remembering; timeouts and missing files are retried
+CACHED_METHODS = ('pdfminer', 'text', 'ocr', 'none')
+# Seconds to wait for another extractor's write before giving up on the cache
+CACHE_BUSY_TIMEOUT = 5.0
+# Bump when cached rows can no longer be trusted; older tables are dropped
+CACHE_SCHEMA = 2
+# PDF page selection: comma-separated first:N, last:N and sample:N (N pages
+# spread evenly over the document), interpreted in the order given
+DEFAULT_PAGES = 'first:3,last:1'
+DEFAULT_PDF_SECONDS = 5.0
+DEFAULT_MAX_CHARS = 16000
+
+# extract_from_pdf() defaults, set from the command line (and handed to pool workers)
+pdf_options = {'pages': DEFAULT_PAGES, 'maxchars': DEFAULT_MAX_CHARS, 'time_budget': DEFAULT_PDF_SECONDS}
+
+
+def navi_root():
+    return os.environ.get('NAVI_ROOT') or os.path.join(REPO_ROOT, 'NAVI')
 
-def extract_from_pdf(path, maxchars=16000):
+
+def parse_pages(spec):
+    """[(kind, n), ...] for a page selection like 'first:3,last:1'; ValueError when malformed."""
+    selection = []
+    for part in spec.split(','):
+        kind, _, n = part.strip().partition(':')
+        if kind not in ('first', 'last', 'sample') or not n.isdigit() or int(n) < 1:
+            raise ValueError(f'bad page selection {part!r}; expected first:N, last:N or sample:N')
+        selection.append((kind, int(n)))
+    return selection
+
+
+def select_pages(count, spec):
+    """Page indexes to read from a count-page document, in reading priority, without repeats."""
+    order = []
+    for kind, n in parse_pages(spec):
+        n = min(n, count)
+        if kind == 'first':
+            order.extend(range(n))
+        elif kind == 'last':
+            order.extend(range(count - n, count))
+        elif n == 1:
+            order.append(0)
+        else:
+            order.extend(round(i * (count - 1) / (n - 1)) for i in range(n))
+    return list(dict.fromkeys(order))
+
+
+def extract_from_pdf(path, maxchars=None, pages=None, time_budget=None):
+    """
+    Text of the selected pages (see select_pages), in page order.
+
+    Pages are laid out one at a time, in selection order, and reading stops
+    as soon as maxchars characters are in hand or time_budget seconds have
+    passed, so a 300-page contract costs no more than the pages needed. A
+    single page is never interrupted; --jobs adds a hard per-file timeout.
+    """
+    return _read_pdf(path, maxchars, pages, time_budget)[0]
+
+
+def _read_pdf(path, maxchars=None, pages=None, time_budget=None):
+    """(text, partial) for extract_from_pdf(); partial when the time budget left selected pages unread."""
+    maxchars = maxchars or pdf_options['maxchars']
+    pages = pages or pdf_options['pages']
+    time_budget = pdf_options['time_budget'] if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget if time_budget else None
     try:
-        text = extract_text(path, maxpages=1)
+        with open(path, 'rb') as fp:
+            # Listing pages only reads the page tree; content is parsed below
+            doc_pages = list(PDFPage.get_pages(fp))
+            rsrcmgr = PDFResourceManager(caching=True)
+            out = io.StringIO()
+            device = TextConverter(rsrcmgr, out, laparams=LAParams())
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
+            spans = {}  # page index -> (start, end) in out
+            order = select_pages(len(doc_pages), pages)
+            partial = False
+            for n, i in enumerate(order):
+                start = out.tell()
+                interpreter.process_page(doc_pages[i])
+                spans[i] = (start, out.tell())
+                if out.tell() >= maxchars:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    partial = n + 1 < len(order)
+                    break
+            device.close()
+        buf = out.getvalue()
+        text = ''.join(buf[a:b] for a, b in (spans[i] for i in sorted(spans)))
         if text and len(text.strip())>0:
-            return text[:maxchars]
+            return text[:maxchars], partial
     except Exception as e:
         pass
-    return ''
+    return '', False
 
 
-def main():
-    if len(sys.argv) < 2:
-        print('Usage: extract_text.py <file1> [file2 ...]')
-        sys.exit(2)
-    out = {}
-    for p in sys.argv[1:]:
-        p = os.path.abspath(p)
-        if not os.path.exists(p):
-            print(p + ' MISSING', file=sys.stderr)
-            out[p] = ''
-            continue
-        text = ''
-        ext = os.path.splitext(p)[1].lower()
-        if ext == '.pdf':
-            text = extract_from_pdf(p)
-        elif ext in ['.txt', '.md']:
-            try:
-                with open(p, 'r', encoding='utf8', errors='ignore') as f:
-                    text = f.read(16000)
-            except Exception:
+def _extract(p):
+    """(text, method, partial) for one path; see extract_record()."""
+    if not os.path.exists(p):
+        print(p + ' MISSING', file=sys.stderr)
+        return '', 'missing', False
+    text = ''
+    method = 'pdfminer'
+    partial = False
+    ext = os.path.splitext(p)[1].lower()
+    if ext == '.pdf':
+        text, partial = _read_pdf(p)
+    elif ext in ['.txt', '.md']:
+        method = 'text'
+        try:
+            with open(p, 'r', encoding='utf8', errors='ignore') as f:
+                text = f.read(pdf_options['maxchars'])
+        except Exception:
+            text = ''
+    else:
+        # Try pdf extraction anyway
+        text, partial = _read_pdf(p)
+    # If empty and we have tesseract, try OCR via image conversion (rudimentary)
+    if (not text or len(text.strip())==0) and has_tesseract:
+        try:
+            # Use PIL to open image or convert PDF page to image is complex; skip PDF OCR here
+            # We can try for image files
+            if ext in ['.png', '.jpg', '.jpeg', '.tiff']:
+                img = Image.open(p)
+                text = pytesseract.image_to_string(img)
+                method = 'ocr'
+            else:
                 text = ''
-        else:
-            # Try pdf extraction anyway
-            text = extract_from_pdf(p)
-        # If empty and we have tesseract, try OCR via image conversion (rudimentary)
-        if (not text or len(text.strip())==0) and has_tesseract:
+        except Exception:
+            text = ''
+    text = (text or '').strip()
+    return text, method if text else 'none', partial
+
+
+def extract_record(p):
+    """
+    {'text', 'method', 'ms'} for one absolute path. method is how the text
+    was read (pdfminer, text, ocr), 'none' when nothing was found and
+    'missing' for a path that does not exist. 'partial': True marks a PDF
+    cut short by --pdf-seconds; such text is never cached.
+    """
+    start = time.perf_counter()
+    text, method, partial = _extract(p)
+    record = {'text': text, 'method': method, 'ms': round((time.perf_counter() - start) * 1000, 1)}
+    if partial:
+        record['partial'] = True
+    return record
+
+
+def extract_file(p):
+    """Stripped text of one absolute path; '' when missing or nothing could be read."""
+    return extract_record(p)['text']
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractCache:
+    """
+    SQLite cache of extraction results, one row per absolute path.
+
+    A row is valid while the file's size, mtime and inode match, so an
+    unchanged document costs one stat and one indexed lookup. A file whose
+    identity changed but whose bytes match a cached row (copied, restored,
+    touched) is recognised by its sha256 instead of being re-extracted;
+    files are only hashed when a row of the same size exists. Least
+    recently used rows are evicted once the cached text passes max_bytes.
+    Rows extracted under other options (`variant`, e.g. a different PDF
+    page selection) never match. Safe to share between threads.
+
+    Every write is committed at once (WAL, synchronous=NORMAL, so without an
+    fsync), so no write lock is held while idle and several extractors,
+    including a resident --serve, can share one database. A database error
+    (locked past the busy timeout, corrupt, disk full) is reported once and
+    the file is simply extracted uncached.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_CACHE_MB << 20, variant=''):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.variant = variant
+        self._db = sqlite3.connect(path, timeout=CACHE_BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != CACHE_SCHEMA:
+            self._db.execute('DROP TABLE IF EXISTS entries')
+            self._db.execute(f'PRAGMA user_version = {CACHE_SCHEMA}')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, ino INTEGER, variant TEXT, '
+                         'sha256 TEXT, text TEXT, method TEXT, ms REAL, bytes INTEGER, last_used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_size ON entries(size)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_sha256 ON entries(sha256)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)')
+        self._db.commit()
+        self._bytes = self._db.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()[0]
+        self._lock = threading.Lock()
+        self._misses = {}  # path -> (stat, sha256 or None), awaiting put()
+        self._touched = {}  # path -> last_used, written with the next commit
+        self._warned = False
+        self.hits = 0
+        self.misses = 0
+
+    def _failed(self, e):
+        """Abandon the current write after a database error; warn once."""
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+        self._touched = {}
+        if not self._warned:
+            self._warned = True
+            print(f'extract_text: cache unavailable, extracting uncached ({self.path}: {e})', file=sys.stderr)
+
+    def get(self, p):
+        """Cached record for p ('cached': True), or None; remembers p's identity for put()."""
+        try:
+            return self._get(p)
+        except sqlite3.Error as e:
+            with self._lock:
+                self._failed(e)
+            return None
+
+    def _get(self, p):
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None
+        identity = (st.st_size, st.st_mtime_ns, st.st_ino, self.variant)
+        with self._lock:
+            row = self._db.execute('SELECT size, mtime_ns, ino, variant, text, method FROM entries WHERE path = ?',
+                                   (p,)).fetchone()
+            if row is not None and tuple(row[:4]) == identity:
+                self._touched[p] = time.time()
+                self.hits += 1
+                return {'text': row[4], 'method': row[5], 'cached': True}
+            same_size = self._db.execute('SELECT 1 FROM entries WHERE size = ? LIMIT 1', (st.st_size,)).fetchone()
+        digest = None
+        if same_size:
             try:
-                # Use PIL to open image or convert PDF page to image is complex; skip PDF OCR here
-                # We can try for image files
-                if ext in ['.png', '.jpg', '.jpeg', '.tiff']:
-                    img = Image.open(p)
-                    text = pytesseract.image_to_string(img)
-                else:
-                    text = ''
-            except Exception:
-                text = ''
-        out[p] = (text or '').strip()
+                digest = _sha256_file(p)
+            except OSError:
+                return None
+            with self._lock:
+                row = self._db.execute('SELECT text, method, ms FROM entries WHERE sha256 = ? AND variant = ? '
+                                       'LIMIT 1', (digest, self.variant)).fetchone()
+                if row is not None:
+                    self._store(p, identity, digest, row[0], row[1], row[2])
+                    self.hits += 1
+                    return {'text': row[0], 'method': row[1], 'cached': True}
+        with self._lock:
+            self._misses[p] = (identity, digest)
+            self.misses += 1
+        return None
+
+    def put(self, p, record):
+        """Store a fresh record for a path get() missed."""
+        with self._lock:
+            identity, digest = self._misses.pop(p, (None, None))
+        if identity is None or record.get('method') not in CACHED_METHODS or record.get('partial'):
+            return
+        if digest is None:
+            try:
+                digest = _sha256_file(p)
+            except OSError:
+                return
+        with self._lock:
+            try:
+                self._store(p, identity, digest, record['text'], record['method'], record.get('ms'))
+            except sqlite3.Error as e:
+                self._failed(e)
+
+    def _store(self, p, identity, digest, text, method, ms):
+        old = self._db.execute('SELECT bytes FROM entries WHERE path = ?', (p,)).fetchone()
+        size = len(text.encode('utf8'))
+        self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (p, *identity, digest, text, method, ms, size, time.time()))
+        self._touched.pop(p, None)
+        self._bytes += size - (old[0] if old else 0)
+        if self._bytes > self.max_bytes:
+            self._evict()
+        self._commit()
+
+    def _evict(self):
+        """Drop least recently used rows down to 90% of max_bytes."""
+        self._flush_touched()
+        target = self.max_bytes * 0.9
+        while self._bytes > target:
+            rows = self._db.execute('SELECT path, bytes FROM entries ORDER BY last_used LIMIT 256').fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            for path, size in rows:
+                if self._bytes <= target:
+                    break
+                self._db.execute('DELETE FROM entries WHERE path = ?', (path,))
+                self._bytes -= size
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany('UPDATE entries SET last_used = ? WHERE path = ?',
+                                 [(used, path) for path, used in self._touched.items()])
+            self._touched = {}
+
+    def _commit(self):
+        self._flush_touched()
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            try:
+                self._commit()
+            except sqlite3.Error as e:
+                self._failed(e)
+            self._db.close()
+
+
+def _worker(conn, options):
+    pdf_options.update(options)
+    while True:
+        try:
+            p = conn.recv()
+        except EOFError:
+            return
+        if p is None:
+            return
+        conn.send((p, extract_record(p)))
+
+
+class ExtractPool:
+    """
+    Worker processes that extract files with a per-file deadline.
+
+    Unlike a concurrent.futures pool, a worker that overruns its deadline
+    (a pathological PDF, a stuck OCR call) is killed and replaced, so one
+    bad file costs one timeout rather than a worker for the whole batch.
+
+    Workers are started through forkserver (spawn where that is missing),
+    never forked from this process: replacements happen while a threaded
+    --serve --socket server may have other threads holding locks. Workers
+    therefore import this module afresh; the function they run must be
+    importable by name.
+    """
+
+    def __init__(self, jobs, timeout=DEFAULT_TIMEOUT):
+        methods = mp.get_all_start_methods()
+        self._ctx = mp.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.timeout = timeout
+        self.lock = threading.Lock()  # one imap() at a time
+        self._workers = [self._spawn() for _ in range(max(1, jobs))]
+
+    def _spawn(self):
+        conn, child = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker, args=(child, dict(pdf_options)), daemon=True)
+        proc.start()
+        child.close()
+        return proc, conn
+
+    def _replace(self, i):
+        proc, conn = self._workers[i]
+        proc.kill()
+        proc.join()
+        conn.close()
+        self._workers[i] = self._spawn()
+
+    def imap(self, paths):
+        """Yield (path, record) for absolute paths as each one finishes."""
+        pending = iter(paths)
+        idle = list(range(len(self._workers)))
+        busy = {}  # conn -> (worker index, path, deadline)
+        try:
+            while True:
+                while idle:
+                    p = next(pending, None)
+                    if p is None:
+                        break
+                    i = idle.pop()
+                    conn = self._workers[i][1]
+                    conn.send(p)
+                    busy[conn] = (i, p, time.monotonic() + self.timeout if self.timeout else None)
+                if not busy:
+                    return
+                deadlines = [d for _, _, d in busy.values() if d is not None]
+                wait = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                for conn in mp_connection.wait(list(busy), wait):
+                    i, p, _ = busy.pop(conn)
+                    try:
+                        result = conn.recv()
+                    except EOFError:
+                        print(p + ' FAILED', file=sys.stderr)
+                        self._replace(i)
+                        result = (p, {'text': '', 'method': 'failed', 'ms': None})
+                    idle.append(i)
+                    yield result
+                now = time.monotonic()
+                for conn, (i, p, deadline) in list(busy.items()):
+                    if deadline is not None and deadline <= now:
+                        del busy[conn]
+                        print(p + ' TIMEOUT', file=sys.stderr)
+                        self._replace(i)
+                        idle.append(i)
+                        yield p, {'text': '', 'method': 'timeout', 'ms': self.timeout * 1000}
+        finally:
+            # Abandoned mid-batch: late results must not leak into the next one
+            for i, _, _ in busy.values():
+                self._replace(i)
+
+    def close(self):
+        for proc, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for proc, conn in self._workers:
+            proc.join(1)
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+            conn.close()
+        self._workers = []
+
+
+def extract_many(paths, pool=None, cache=None):
+    """
+    Yield (path, record) for absolute paths as each one is ready: cache
+    hits first, then the rest as extracted here or on `pool`.
+    """
+    misses = []
+    for p in paths:
+        start = time.perf_counter()
+        record = cache.get(p) if cache is not None else None
+        if record is None:
+            misses.append(p)
+            continue
+        record['ms'] = round((time.perf_counter() - start) * 1000, 1)
+        yield p, record
+    results = pool.imap(misses) if pool is not None else ((p, extract_record(p)) for p in misses)
+    for p, record in results:
+        if cache is not None:
+            cache.put(p, record)
+        yield p, record
+
+
+def handle_request(line, pool=None, cache=None):
+    """Reply dict for one JSON-lines request; `pool` extracts multi-file requests in parallel."""
+    try:
+        req = json.loads(line)
+        paths = req['paths'] if 'paths' in req else [req['path']]
+        if not isinstance(paths, list) or not all(isinstance(p, str) and p for p in paths):
+            raise TypeError('paths must be a list of strings')
+        paths = [os.path.abspath(p) for p in paths]
+    except (ValueError, AttributeError, KeyError, TypeError):
+        return {'error': 'expected {"path": ...} or {"paths": [...]}'}
+    reply = {'text': {}}
+    if 'id' in req:
+        reply['id'] = req['id']
+    reply['text'].update(dict.fromkeys(paths, ''))
+    with pool.lock if pool is not None else contextlib.nullcontext():
+        reply['text'].update((p, record['text']) for p, record in extract_many(paths, pool, cache))
+    return reply
+
+
+def serve_stream(rfile, wfile, pool=None, cache=None):
+    """Answer requests line by line until EOF; works on text or binary streams."""
+    for line in rfile:
+        if isinstance(line, bytes):
+            line = line.decode('utf8', errors='replace')
+        if not line.strip():
+            continue
+        reply = json.dumps(handle_request(line, pool, cache)) + '\n'
+        wfile.write(reply if isinstance(wfile, io.TextIOBase) else reply.encode('utf8'))
+        wfile.flush()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        serve_stream(self.rfile, self.wfile, self.server.pool, self.server.cache)
+
+
+def serve_socket(path, pool=None, cache=None):
+    """Serve each connection on a Unix socket until interrupted."""
+    if os.path.exists(path):
+        os.remove(path)  # stale socket from a previous server
+    server = socketserver.ThreadingUnixStreamServer(path, _Handler)
+    server.daemon_threads = True
+    server.pool = pool
+    server.cache = cache
+    print('extract_text serving on ' + path, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def pages_arg(spec):
+    try:
+        parse_pages(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract text from documents')
+    parser.add_argument('paths', nargs='*', help='files to extract')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='print one {path, text, method, ms} JSON line per file as it completes')
+    parser.add_argument('--serve', action='store_true',
+                        help='stay resident and answer JSON-lines requests on stdin (or --socket)')
+    parser.add_argument('--socket', metavar='PATH', help='with --serve, listen on this Unix socket')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='extract on N worker processes (default 1: in this process)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SECONDS',
+                        help=f'with --jobs, give up on a file after this long (default {DEFAULT_TIMEOUT:g}; 0: never)')
+    parser.add_argument('--pages', type=pages_arg, default=DEFAULT_PAGES, metavar='SPEC',
+                        help=f'PDF pages to read, e.g. first:2,last:2 or sample:5 (default {DEFAULT_PAGES})')
+    parser.add_argument('--max-chars', type=int, default=DEFAULT_MAX_CHARS, metavar='N',
+                        help=f'stop reading a PDF once this many characters are in hand (default {DEFAULT_MAX_CHARS})')
+    parser.add_argument('--pdf-seconds', type=float, default=DEFAULT_PDF_SECONDS, metavar='SECONDS',
+                        help=f'stop reading further PDF pages after this long (default {DEFAULT_PDF_SECONDS:g}; 0: no limit)')
+    parser.add_argument('--cache', metavar='PATH',
+                        help=f'result cache database (default NAVI/metadata/{CACHE_FILENAME})')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_CACHE_MB, metavar='MB',
+                        help=f'evict least recently used results past this much cached text (default {DEFAULT_CACHE_MB})')
+    parser.add_argument('--no-cache', action='store_true', help='always extract; do not read or write the cache')
+    args = parser.parse_args(argv)
+    if not args.serve and not args.paths:
+        print('Usage: extract_text.py <file1> [file2 ...]')
+        sys.exit(2)
+    pdf_options.update(pages=args.pages, maxchars=args.max_chars, time_budget=args.pdf_seconds)
+    cache = None
+    if not args.no_cache:
+        cache_path = args.cache or os.path.join(navi_root(), 'metadata', CACHE_FILENAME)
+        try:
+            cache = ExtractCache(cache_path, int(args.cache_max_mb * (1 << 20)),
+                                 json.dumps(pdf_options, sort_keys=True))
+        except (OSError, sqlite3.Error) as e:
+            # The cache is an optimisation; extraction never depends on writable state
+            print(f'extract_text: cache disabled ({cache_path}: {e})', file=sys.stderr)
+    pool = ExtractPool(args.jobs, args.timeout) if args.jobs > 1 else None
+    try:
+        if args.serve:
+            if args.socket:
+                serve_socket(args.socket, pool, cache)
+            else:
+                serve_stream(sys.stdin, sys.stdout, pool, cache)
+            return
+        paths = [os.path.abspath(p) for p in args.paths]
+        if args.ndjson:
+            # Nothing is held beyond the file in hand; callers can act on each line
+            for p, record in extract_many(paths, pool, cache):
+                print(json.dumps({'path': p, 'text': record['text'], 'method': record['method'],
+                                  'ms': record['ms']}), flush=True)
+            return
+        out = dict.fromkeys(paths, '')
+        out.update((p, record['text']) for p, record in extract_many(paths, pool, cache))
+    finally:
+        if pool is not None:
+            pool.close()
+        if cache is not None:
+            cache.close()
     # Print JSON to stdout
-    import json
     print(json.dumps(out))
 
 if __name__ == '__main__':
@@ -7,10 +7,36 @@ Routes files to 9 offices ONLY:
 Default route: EXEC (Clara handles unclear items)
 No legacy code. No agent1. No ghosts.
 """
+import argparse
+import cProfile
+import ctypes
+import errno
+import hashlib
+import heapq
+import importlib.util
 import json
 import os
+import select
 import shutil
+import signal
+import stat
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from itertools import count, islice
+from types import MappingProxyType
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflink support
+    fcntl = None
 
 # === CONFIGURATION ===
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -23,20 +49,628 @@ PACKAGES_DIR = os.path.join(NAVI_ROOT, 'packages')
 
 # The ONLY valid offices - nothing else exists
 VALID_OFFICES = ['CFO', 'CLO', 'COO', 'CSO', 'CMO', 'CTO', 'AIR', 'EXEC', 'COS']
+VALID_OFFICE_SET = frozenset(VALID_OFFICES)
 DEFAULT_OFFICE = 'EXEC'  # Clara handles unclear items
 
+LEDGER_FILENAME = 'mailroom_ledger.jsonl'
+BLOB_INDEX_FILENAME = 'blob_index.jsonl'
+ROUTE_CACHE_FILENAME = 'route_cache.jsonl'
+JOURNAL_FILENAME = 'delivery_journal.jsonl'
+METRICS_FILENAME = 'mailroom_metrics.prom'
+PROFILE_FILENAME = 'mailroom.pstats'
+# Packages are assembled under offices/<OFFICE>/.staging/<pkg> and renamed
+# into the inbox once complete; <pkg>.progress.jsonl next to it records the
+# files already staged so an interrupted copy resumes.
+STAGING_DIRNAME = '.staging'
+PROGRESS_SUFFIX = '.progress.jsonl'
+
+# Delivery pool size unless routing_config.json sets mailroom.delivery_workers
+DEFAULT_DELIVERY_WORKERS = 4
+# Jobs planned ahead of the delivery pool at a time
+DELIVERY_BATCH_SIZE = 256
+# Sharded mode (mailroom.shards / --shards): smaller batches are not worth
+# a round trip to the process pool and are handled in-process
+SHARD_MIN_BATCH = 32
+# Seconds between daemon cycles (--interval)
+DAEMON_INTERVAL = 0.25
+# Seconds between full sweeps when inotify drives the daemon, and between
+# unconditional sweeps when it polls (--reconcile)
+RECONCILE_INTERVAL = 60.0
+# Quiet period that closes an inotify batch, in seconds
+INTAKE_SETTLE = 0.05
+# A polled directory mtime this recent may still move within the same
+# timestamp tick (2s on FAT), so it is not trusted to mean "unchanged"
+POLL_RACY_NS = 2_000_000_000
+
+SIDECAR_SUFFIXES = ('.navi.json', '.meta.json')
+# Sidecar fields holding extracted text, in order of preference
+SIDECAR_TEXT_FIELDS = ('extracted_text_snippet', 'extracted_text', 'text', 'excerpt')
+# Files without a sidecar are classified from their own text only when text-like
+TEXT_EXTENSIONS = frozenset(('.txt', '.md', '.csv', '.eml', '.htm', '.html', '.json', '.xml', '.log'))
+# Characters of text the classifier looks at (same cap as the router's snippets)
+MAX_CLASSIFY_CHARS = 16000
+# urgency_keywords tiers, most urgent first; higher rank is delivered first
+URGENCY_RANKS = {'urgent': 3, 'past_due': 2, 'high': 1}
+# Sidecar fields that may name a tier directly ("urgent", "past due", ...)
+SIDECAR_URGENCY_FIELDS = ('urgency', 'priority')
+# Planned jobs held in the urgency queue ahead of delivery
+DEFAULT_PRIORITY_WINDOW = 8192
+
+# In-process present page generator and the snapshot kept between daemon cycles
+_present = {'path': None, 'module': None, 'snapshot': None}
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+# copy: full byte copy; hardlink/reflink: share blocks with NAVI/processed;
+# rename: move out of NAVI/processed. All but copy need the same volume.
+DELIVERY_MODES = ('copy', 'hardlink', 'reflink', 'rename')
+FICLONE = 0x40049409  # linux/fs.h _IOW(0x94, 9, int)
+# Deliveries are written under a temp name and renamed into place; these are
+# the temp names a crash can leave next to an inbox file or its sidecar
+PART_SUFFIX = '.navi-part'
+TEMP_SUFFIXES = (PART_SUFFIX, '.navi-link', '.navi-clone')
+# errnos meaning "this strategy is unavailable here", not "delivery failed"
+_NO_LINK_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL, errno.ENOTTY,
+    errno.EOPNOTSUPP, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP),
+}
+
+
+def navi_root():
+    """Resolve NAVI root at call time: NAVI_ROOT env wins, else ROOT/NAVI."""
+    return os.environ.get('NAVI_ROOT') or os.path.join(ROOT, 'NAVI')
+
+
+def metadata_dir():
+    return os.path.join(navi_root(), 'metadata')
+
+
+def _read_jsonl(path):
+    """Yield JSON objects from an append-only JSONL file, skipping torn lines."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Torn trailing line from an interrupted run; ignore it
+                continue
+
+
+def _append_jsonl(path, entries, fsync=False):
+    if not entries:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _rewrite_jsonl(path, entries):
+    """Atomically replace a JSONL file with `entries` (drops superseded lines)."""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+    os.replace(tmp, path)
+
+
+# Histogram bucket bounds (Prometheus `le`), in seconds and bytes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+BYTES_BUCKETS = (1 << 10, 16 << 10, 256 << 10, 1 << 20, 16 << 20, 256 << 20, 1 << 30)
+ARRIVAL_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0, 4 * 3600.0, 86400.0)
+
+# name -> (type, help, histogram buckets)
+METRIC_DEFS = {
+    'mailroom_stage_seconds': ('histogram', 'Wall time per runner stage.', STAGE_BUCKETS),
+    'mailroom_file_delivery_seconds': ('histogram', 'Per-file delivery latency (file plus sidecar).', LATENCY_BUCKETS),
+    'mailroom_file_delivery_bytes': ('histogram', 'Size of each delivered file.', BYTES_BUCKETS),
+    'mailroom_package_delivery_seconds': ('histogram', 'Per-package delivery latency.', STAGE_BUCKETS),
+    'mailroom_time_to_inbox_seconds': ('histogram', 'Source mtime to inbox delivery, by urgency tier.',
+                                       ARRIVAL_BUCKETS),
+    'mailroom_files_delivered_total': ('counter', 'Files delivered to an office inbox.', None),
+    'mailroom_bytes_delivered_total': ('counter', 'Bytes of files delivered to an office inbox.', None),
+    'mailroom_delivery_errors_total': ('counter', 'Files or packages that failed to deliver.', None),
+    'mailroom_files_skipped_total': ('counter', 'Files skipped because the ledger already has them.', None),
+    'mailroom_packages_delivered_total': ('counter', 'Packages renamed into an office inbox.', None),
+    'mailroom_packages_repaired_total': ('counter', 'Existing inbox packages repaired from source.', None),
+    'mailroom_packages_held_total': ('counter', 'Package attempts held back for not matching the manifest.', None),
+    'mailroom_package_files_staged_total': ('counter', 'Package files copied into staging.', None),
+    'mailroom_package_bytes_staged_total': ('counter', 'Package bytes copied into staging.', None),
+    'mailroom_route_cache_total': ('counter', 'Sidecar route cache lookups.', None),
+    'mailroom_entities_tagged_total': ('counter', 'Delivered sidecars tagged with an entity.', None),
+    'mailroom_journal_replayed_total': ('counter', 'Interrupted-run journal entries settled at startup.', None),
+    'mailroom_present_page_errors_total': ('counter', 'Failed present page regenerations.', None),
+    'mailroom_daemon_cycle_errors_total': ('counter', 'Daemon cycles that failed and were retried.', None),
+    'mailroom_last_run_timestamp_seconds': ('gauge', 'Unix time the metrics were last written.', None),
+}
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms for this process, written as a
+    Prometheus text-format file (node_exporter textfile collector layout)
+    to NAVI/logs/mailroom_metrics.prom. Values are cumulative for the life
+    of the process. Safe to update from delivery threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}      # (name, labels) -> number
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, self._labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        buckets = METRIC_DEFS[name][2]
+        key = (name, self._labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('mailroom_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def value(self, name, **labels):
+        return self._values.get((name, self._labels(labels)), 0)
+
+    def histogram(self, name, **labels):
+        """(count, sum) observed for a histogram series."""
+        hist = self._histograms.get((name, self._labels(labels)))
+        return (hist[-1], hist[-2]) if hist else (0, 0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+
+    def drain(self):
+        """Return and clear everything recorded so far (shard workers hand it to the parent)."""
+        with self._lock:
+            snapshot = (self._values, self._histograms)
+            self._values, self._histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        values, histograms = snapshot
+        with self._lock:
+            for key, value in values.items():
+                if key[0] == 'mailroom_last_run_timestamp_seconds':
+                    continue
+                self._values[key] = self._values.get(key, 0) + value
+            for key, counts in histograms.items():
+                mine = self._histograms.get(key)
+                if mine is None:
+                    self._histograms[key] = list(counts)
+                else:
+                    for i, n in enumerate(counts):
+                        mine[i] += n
+
+    def render(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        with self._lock:
+            values = dict(self._values)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in METRIC_DEFS.items():
+            if kind == 'histogram':
+                series = sorted((k, v) for k, v in histograms.items() if k[0] == name)
+            else:
+                series = sorted((k, v) for k, v in values.items() if k[0] == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (_, labels), value in series:
+                if kind != 'histogram':
+                    lines.append(f'{name}{fmt(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, n in zip(buckets, value):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{fmt(labels, [("le", f"{bound:g}")])} {cumulative}')
+                lines.append(f'{name}_bucket{fmt(labels, [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{fmt(labels)} {value[-2]:.6f}')
+                lines.append(f'{name}_count{fmt(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path=None):
+        """Atomically (re)write the metrics file; returns its path."""
+        path = path or os.path.join(navi_root(), 'logs', METRICS_FILENAME)
+        self.set('mailroom_last_run_timestamp_seconds', round(time.time(), 3))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+        return path
+
+
+METRICS = Metrics()
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over many phrases at once.
+
+    Matching is case-insensitive, treats any run of whitespace as one space
+    and only reports whole-word hits (no 'gas' inside 'Vegas'). A single
+    pass finds every phrase, so it costs O(len(text) + hits) however many
+    phrases are compiled in.
+    """
+
+    __slots__ = ('_goto', '_fail', '_out', '_link', '_lengths', '_values')
+
+    def __init__(self, phrases):
+        """phrases: iterable of (phrase, value); a value is reported per hit."""
+        goto = [{}]
+        out = [[]]
+        self._lengths = []
+        self._values = []
+        for phrase, value in phrases:
+            key = self.normalize(phrase) if isinstance(phrase, str) else ''
+            if not key:
+                continue
+            state = 0
+            for ch in key:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(len(self._values))
+            self._lengths.append(len(key))
+            self._values.append(value)
+
+        # Breadth-first failure links; `link` jumps straight to the nearest
+        # fail-state that ends a phrase, so reporting stays proportional to hits
+        fail = [0] * len(goto)
+        link = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                link[nxt] = fail[nxt] if out[fail[nxt]] else link[fail[nxt]]
+        self._goto, self._fail, self._out, self._link = goto, fail, out, link
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.lower().split())
+
+    def __bool__(self):
+        return bool(self._values)
+
+    def finditer(self, text):
+        """Yield (start, end, value) per whole-word hit, offsets into normalize(text)."""
+        text = self.normalize(text)
+        goto, fail, out, link, lengths, values = (
+            self._goto, self._fail, self._out, self._link, self._lengths, self._values)
+        size = len(text)
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if out[state] else link[state]
+            if not hit or (i + 1 < size and text[i + 1].isalnum()):
+                continue
+            while hit:
+                for pid in out[hit]:
+                    start = i + 1 - lengths[pid]
+                    if start == 0 or not text[start - 1].isalnum():
+                        yield start, i + 1, values[pid]
+                hit = link[hit]
+
+
+def _as_list(value):
+    """value as a fresh list: [] for None/empty, [value] for a single string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class RoutingRules(Mapping):
+    """
+    Routing config compiled once for per-file lookups.
+
+    Behaves as a read-only mapping over the raw routing_config.json (so
+    `config.get(...)` keeps working) and adds:
+      - a character trie over filename_overrides prefixes
+      - a case-folded function -> office table
+      - a keyword classifier (keywords_to_function, doc_type_to_function,
+        priority_order), an entity tagger (entity_signals) and an urgency
+        scanner (urgency_keywords), each compiled on first use
+    Lookups cost O(len(filename)) / O(1) however many rules are configured;
+    classification is linear in the text length.
+    """
+
+    __slots__ = ('_raw', '_trie', '_route_exact', '_route_folded', '_classifier', '_priority',
+                 '_tagger', '_urgency', 'route_version', 'tag_version')
+
+    def __init__(self, config):
+        self._raw = MappingProxyType(dict(config))
+        # Identifies the route -> office mapping and the classifier; cached
+        # sidecar decisions made under another version are re-derived (see RouteCache)
+        versioned = [config.get(k) or {} for k in
+                     ('function_to_office', 'keywords_to_function', 'doc_type_to_function', 'priority_order')]
+        self.route_version = '{}:{}'.format(config.get('_version', ''), hashlib.sha256(
+            json.dumps(versioned, sort_keys=True).encode('utf-8')).hexdigest()[:12])
+        tagged = [config.get(k) or {} for k in ('entity_signals', 'urgency_keywords')]
+        self.tag_version = hashlib.sha256(json.dumps(tagged, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        self._classifier = None
+        self._tagger = None
+        self._urgency = None
+        priority = config.get('priority_order') or []
+        self._priority = {f: i for i, f in reversed(list(enumerate(priority))) if isinstance(f, str)}
+        # Trie node: {char: node, None: (rule_order, office)}
+        self._trie = {}
+        for order, (prefix, office) in enumerate((config.get('filename_overrides') or {}).items()):
+            if not prefix or office not in VALID_OFFICE_SET:
+                continue
+            node = self._trie
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, (order, office))
+        self._route_exact = {}
+        self._route_folded = {}
+        for function, office in (config.get('function_to_office') or {}).items():
+            if office not in VALID_OFFICE_SET or not isinstance(function, str):
+                continue
+            self._route_exact[function] = office
+            self._route_folded.setdefault(function.casefold(), office)
+
+    def __getitem__(self, key):
+        return self._raw[key]
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def override_for(self, filename):
+        """Office of the first configured prefix matching filename, or None."""
+        node = self._trie
+        best = None
+        for ch in filename or '':
+            node = node.get(ch)
+            if node is None:
+                break
+            hit = node.get(None)
+            if hit and (best is None or hit[0] < best[0]):
+                best = hit
+        return best[1] if best else None
+
+    def office_for_route(self, route):
+        """Office for a sidecar route/function, or DEFAULT_OFFICE."""
+        if not route or not isinstance(route, str):
+            return DEFAULT_OFFICE
+        # Normalize: if dotted like 'LHI.Finance', take last segment
+        if '.' in route:
+            route = route.rsplit('.', 1)[-1]
+        # Direct match to valid office
+        upper = route.upper()
+        if upper in VALID_OFFICE_SET:
+            return upper
+        return self._route_exact.get(route) or self._route_folded.get(route.casefold()) or DEFAULT_OFFICE
+
+    def _compile_classifier(self):
+        phrases = []
+        for function, keywords in (self._raw.get('keywords_to_function') or {}).items():
+            if isinstance(keywords, list):
+                phrases.extend((kw, function) for kw in keywords)
+        for doc_type, function in (self._raw.get('doc_type_to_function') or {}).items():
+            if isinstance(doc_type, str) and isinstance(function, str):
+                phrases.append((doc_type, function))
+                if '_' in doc_type:
+                    phrases.append((doc_type.replace('_', ' '), function))
+        return KeywordAutomaton(phrases)
+
+    def classify(self, text, filename=None):
+        """
+        Function suggested by keyword and doc-type hits in text (first
+        MAX_CLASSIFY_CHARS characters) and filename, or None. When several
+        functions match, the earliest in priority_order wins, then the one
+        with the most hits.
+        """
+        if self._classifier is None:
+            self._classifier = self._compile_classifier()
+        if not self._classifier:
+            return None
+        hits = {}
+        for source in (filename, text[:MAX_CLASSIFY_CHARS] if text else None):
+            if source:
+                for _, _, function in self._classifier.finditer(source):
+                    hits[function] = hits.get(function, 0) + 1
+        if not hits:
+            return None
+        last = len(self._priority)
+        return min(hits, key=lambda f: (self._priority.get(f, last), -hits[f], f))
+
+    def _compile_tagger(self):
+        phrases = []
+        for entity, signals in (self._raw.get('entity_signals') or {}).items():
+            if not isinstance(signals, dict):
+                continue
+            # A lone string is one name (or address), not a list of characters
+            names = _as_list(signals.get('names'))
+            if signals.get('name'):
+                names.append(signals['name'])
+            phrases.extend((name, (entity, 'name')) for name in names)
+            phrases.extend((address, (entity, 'address')) for address in _as_list(signals.get('addresses')))
+        return KeywordAutomaton(phrases)
+
+    def tag_entity(self, text):
+        """
+        Entity id named in text (first MAX_CLASSIFY_CHARS characters), or
+        None. As in the router's matchEntity(): the longest name hit wins;
+        an address only counts when no name matched.
+        """
+        if not text:
+            return None
+        if self._tagger is None:
+            self._tagger = self._compile_tagger()
+        if not self._tagger:
+            return None
+        best_name = None  # (length, entity)
+        first_address = None
+        for start, end, (entity, kind) in self._tagger.finditer(text[:MAX_CLASSIFY_CHARS]):
+            if kind == 'name':
+                if best_name is None or end - start > best_name[0]:
+                    best_name = (end - start, entity)
+            elif first_address is None:
+                first_address = entity
+        return best_name[1] if best_name else first_address
+
+    def _compile_urgency(self):
+        phrases = []
+        for tier, keywords in (self._raw.get('urgency_keywords') or {}).items():
+            if tier in URGENCY_RANKS and isinstance(keywords, list):
+                phrases.extend((kw, tier) for kw in keywords)
+        return KeywordAutomaton(phrases)
+
+    def urgency(self, text, filename=None, sc=None):
+        """
+        Most urgent urgency_keywords tier hit in text (first
+        MAX_CLASSIFY_CHARS characters) or filename, or named by a sidecar
+        `urgency`/`priority` field; None for routine mail.
+        """
+        tiers = set()
+        for field in SIDECAR_URGENCY_FIELDS:
+            value = sc.get(field) if sc is not None else None
+            if isinstance(value, str):
+                tiers.add(KeywordAutomaton.normalize(value).replace(' ', '_'))
+        if self._urgency is None:
+            self._urgency = self._compile_urgency()
+        if self._urgency:
+            # FINAL_NOTICE_acme.pdf reads as "final notice"
+            name = filename.replace('_', ' ').replace('-', ' ') if filename else None
+            for source in (name, text[:MAX_CLASSIFY_CHARS] if text else None):
+                if source:
+                    tiers.update(tier for _, _, tier in self._urgency.finditer(source))
+        return max(tiers & URGENCY_RANKS.keys(), key=URGENCY_RANKS.get, default=None)
+
+
+def compile_rules(config):
+    """Return config as RoutingRules (no-op when already compiled)."""
+    if isinstance(config, RoutingRules):
+        return config
+    return RoutingRules(config or {})
+
+
+def config_path():
+    return os.path.join(navi_root(), 'config', 'routing_config.json')
+
 
 def load_config():
-    """Load routing config (computed from ROOT at runtime)."""
-    navi_root = os.path.join(ROOT, 'NAVI')
-    cfg_path = os.path.join(navi_root, 'config', 'routing_config.json')
+    """Load and compile routing config (computed from ROOT at runtime)."""
+    cfg_path = config_path()
     if os.path.exists(cfg_path):
         try:
             with open(cfg_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                return RoutingRules(json.load(f))
         except Exception:
             pass
-    return {}
+    return RoutingRules({})
+
+
+class ConfigWatcher:
+    """
+    Compiled routing rules for a long-running mailroom.
+
+    routing_config.json is re-read only when its mtime or size changes and
+    recompiled only when its content hash differs. A config that fails to
+    parse (e.g. half-saved) keeps the previous rules in force.
+    """
+
+    def __init__(self):
+        self.rules = None
+        self.reloads = 0
+        self._stamp = None
+        self._digest = None
+
+    def current(self):
+        path = config_path()
+        try:
+            st = os.stat(path)
+            stamp = (path, st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = (path, None, None)
+        if self.rules is not None and stamp == self._stamp:
+            return self.rules
+        self._stamp = stamp
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == self._digest:
+            return self.rules
+
+        try:
+            rules = RoutingRules(json.loads(data.decode('utf-8')) if data else {})
+        except Exception as e:
+            if self.rules is not None:
+                print(f"Ignoring unreadable routing config {path}: {e}", file=sys.stderr)
+                return self.rules
+            rules = RoutingRules({})
+        self._digest = digest
+        self.rules = rules
+        self.reloads += 1
+        return rules
 
 
 def get_office_from_route(route, config):
@@ -44,27 +678,7 @@ def get_office_from_route(route, config):
     Map a route/function to a valid office.
     Returns office name or DEFAULT_OFFICE.
     """
-    if not route:
-        return DEFAULT_OFFICE
-    
-    # Normalize: if dotted like 'LHI.Finance', take last segment
-    if '.' in route:
-        route = route.split('.')[-1]
-    
-    # Direct match to valid office
-    if route.upper() in VALID_OFFICES:
-        return route.upper()
-    if route in VALID_OFFICES:
-        return route
-    
-    # Map function to office via config
-    function_to_office = config.get('function_to_office', {})
-    mapped = function_to_office.get(route)
-    if mapped and mapped in VALID_OFFICES:
-        return mapped
-    
-    # Default
-    return DEFAULT_OFFICE
+    return compile_rules(config).office_for_route(route)
 
 
 def check_filename_override(filename, config):
@@ -72,112 +686,1402 @@ def check_filename_override(filename, config):
     Check if filename matches an override pattern.
     Returns office name or None.
     """
-    overrides = config.get('filename_overrides', {})
-    for prefix, office in overrides.items():
-        if filename and filename.startswith(prefix):
-            if office in VALID_OFFICES:
-                return office
-    return None
+    return compile_rules(config).override_for(filename)
+
+
+def delivery_mode(config):
+    """Delivery strategy from routing_config.json (mailroom.delivery_mode), default 'copy'."""
+    mode = (config.get('mailroom') or {}).get('delivery_mode') or 'copy'
+    if mode not in DELIVERY_MODES:
+        print(f"Unknown delivery_mode {mode!r}; using copy", file=sys.stderr)
+        return 'copy'
+    return mode
+
+
+def _link_into(src, dst):
+    """Hardlink src to dst, replacing dst atomically. False when links cannot be used here."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return True
+    tmp = dst + '.navi-link'
+    try:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.link(src, tmp)
+    except OSError as e:
+        if e.errno in _NO_LINK_ERRNOS:
+            return False
+        raise
+    os.replace(tmp, dst)
+    return True
+
+
+def _reflink_into(src, dst):
+    """Clone src into dst with the FICLONE ioctl. False when the filesystem cannot clone."""
+    if fcntl is None:
+        return False
+    tmp = dst + '.navi-clone'
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if e.errno in _NO_LINK_ERRNOS:
+            return False
+        raise
+    shutil.copystat(src, tmp)
+    os.replace(tmp, dst)
+    return True
+
+
+def place_file(src, dst, mode='copy'):
+    """
+    Put src at dst using the delivery mode.
+    hardlink/reflink/rename fall back to a plain copy only when the mode
+    cannot work here (different devices, or no filesystem support).
+    """
+    if mode == 'rename':
+        try:
+            os.replace(src, dst)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    elif mode == 'hardlink':
+        if _link_into(src, dst):
+            return
+    elif mode == 'reflink':
+        if _reflink_into(src, dst):
+            return
+    _copy_atomic(src, dst)
+
+
+def _copy_atomic(src, dst):
+    """Copy src to dst through a temp file, so dst is never seen half-written."""
+    tmp = dst + PART_SUFFIX
+    try:
+        shutil.copy2(src, tmp)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, dst)
+
+
+def dedupe_enabled(config):
+    return bool((config.get('mailroom') or {}).get('dedupe_store'))
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressed store behind the office inboxes.
+
+    Each distinct file body is kept once under NAVI/blobs/sha256/<aa>/<digest>
+    and inbox entries are hardlinks to it, so the same attachment routed from
+    several processed subdirs (or to several offices) costs its bytes once.
+    A blob is always its own copy of the body (a reflink or plain copy, or the
+    source itself in rename mode), never a hardlink to a processed file that
+    may later be rewritten in place. Known digests are indexed in NAVI/metadata/blob_index.jsonl. Safe to
+    share between delivery threads: the lock covers only the index and
+    counters, so bodies are copied concurrently, and a thread delivering a
+    body another thread is still storing waits for that copy instead of
+    storing it twice.
+    """
+
+    def __init__(self, root, index_path):
+        self.root = root
+        self.index_path = index_path
+        self._known = set()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._storing = {}  # digest -> Event set once its blob is in place
+        self.hits = 0
+        self.bytes_saved = 0
+        self.stored = 0
+
+    @classmethod
+    def load(cls):
+        store = cls(os.path.join(navi_root(), 'blobs', 'sha256'),
+                    os.path.join(metadata_dir(), BLOB_INDEX_FILENAME))
+        store._known.update(entry['hash'] for entry in _read_jsonl(store.index_path))
+        return store
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def deliver(self, src, dst, mode='copy', digest=None):
+        """
+        Place src at dst through the store. Returns True on a dedupe hit
+        (the body was already stored and no new bytes were written).
+        `digest` skips re-hashing a source the caller already hashed.
+        """
+        digest = digest or _sha256_file(src)
+        blob = self.blob_path(digest)
+        src_size = os.path.getsize(src)
+        while True:
+            with self._lock:
+                storing = self._storing.get(digest)
+                if storing is None:
+                    # The blob on disk decides, not the index: a blob removed by hand is stored again
+                    hit = self._intact(blob, src, src_size)
+                    if not hit:
+                        storing = self._storing[digest] = threading.Event()
+                    break
+            storing.wait()
+        if not hit:
+            try:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                # Shard processes may store the same body concurrently; each
+                # writes its own part file and the identical renames race harmlessly
+                part = f'{blob}.{os.getpid()}.{threading.get_ident()}.part'
+                place_file(src, part, 'rename' if mode == 'rename' else 'reflink')
+                os.replace(part, blob)
+            finally:
+                with self._lock:
+                    del self._storing[digest]
+                storing.set()
+        size = os.path.getsize(blob)
+        with self._lock:
+            if not hit:
+                self.stored += 1
+            if digest not in self._known:
+                self._known.add(digest)
+                self._pending.append({
+                    'hash': digest,
+                    'size': size,
+                    'source': os.path.relpath(src, navi_root()),
+                    'stored_at': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+                })
+        if not _link_into(blob, dst):
+            _copy_atomic(blob, dst)
+        if hit:
+            if mode == 'rename':
+                os.remove(src)
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += size
+        return hit
+
+    @staticmethod
+    def _intact(blob, src, src_size):
+        """
+        True when blob can stand in for src. A size mismatch (a truncated or
+        rewritten blob) or a blob sharing src's inode (hardlinked by an older
+        release, so it follows edits to src) is stored again.
+        """
+        try:
+            st = os.stat(blob)
+        except FileNotFoundError:
+            return False
+        if st.st_size != src_size or os.path.samestat(st, os.stat(src)):
+            print(f"Blob {os.path.basename(blob)} does not match its source; storing it again", file=sys.stderr)
+            return False
+        return True
+
+    def flush(self):
+        """Append digests stored since the last flush to the index."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        _append_jsonl(self.index_path, pending)
 
+    def take_stats(self):
+        """Dedupe counters since the last call, for the routing summary."""
+        with self._lock:
+            stats = {'hits': self.hits, 'bytes_saved': self.bytes_saved, 'blobs_stored': self.stored}
+            self.hits = self.bytes_saved = self.stored = 0
+        return stats
 
-def deliver_to_office(src_path, sidecar_path, office):
+    def take_pending(self):
+        """Index entries not yet flushed, handed over instead of written (shard workers)."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def absorb(self, pending, stats):
+        """Adopt a shard worker's index entries and counters; this store writes the index."""
+        with self._lock:
+            for entry in pending:
+                if entry['hash'] not in self._known:
+                    self._known.add(entry['hash'])
+                    self._pending.append(entry)
+            self.hits += stats['hits']
+            self.bytes_saved += stats['bytes_saved']
+            self.stored += stats['blobs_stored']
+
+
+def write_tagged_sidecar(sidecar_path, dst, entity):
+    """
+    Write the delivered sidecar with `entity` filled in (a minimal one when
+    the file had no sidecar). Always a new file, so a hardlinked or renamed
+    source sidecar is never edited in place.
     """
-    Copy file and sidecar to office inbox.
-    Returns True on success.
+    sc = {'filename': os.path.basename(dst[:-len('.navi.json')])}
+    if sidecar_path:
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            sc = json.load(f)
+    sc['entity'] = entity
+    tmp = dst + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(sc, f, indent=2)
+    os.replace(tmp, dst)
+
+
+def deliver_to_office(src_path, sidecar_path, office, mode='copy', store=None, size=None, entity=None):
     """
-    if office not in VALID_OFFICES:
+    Copy (or link/rename, see place_file) file and sidecar to office inbox.
+    With a BlobStore the file is linked from the store instead.
+    Returns True on success. `size` (the source size, when the caller
+    already has it) feeds the bytes metrics. With an `entity` the delivered
+    sidecar is rewritten to carry it.
+    """
+    start = time.perf_counter()
+    if office not in VALID_OFFICE_SET:
         office = DEFAULT_OFFICE
     
-    inbox = os.path.join(NAVI_ROOT, 'offices', office, 'inbox')
+    inbox = os.path.join(navi_root(), 'offices', office, 'inbox')
     os.makedirs(inbox, exist_ok=True)
     
     filename = os.path.basename(src_path)
     dst = os.path.join(inbox, filename)
     
     try:
-        shutil.copy2(src_path, dst)
-        if sidecar_path and os.path.exists(sidecar_path):
-            shutil.copy2(sidecar_path, dst + '.navi.json')
-        return True
+        if store is not None:
+            store.deliver(src_path, dst, mode)
+        else:
+            place_file(src_path, dst, mode)
+        if entity:
+            try:
+                write_tagged_sidecar(sidecar_path, dst + '.navi.json', entity)
+                if sidecar_path and mode == 'rename':
+                    os.remove(sidecar_path)
+                METRICS.inc('mailroom_entities_tagged_total', entity=entity)
+            except (OSError, ValueError, AttributeError, TypeError):
+                # Unreadable sidecar: deliver it untouched
+                entity = None
+        if sidecar_path and not entity:
+            try:
+                place_file(sidecar_path, dst + '.navi.json', mode)
+            except FileNotFoundError:
+                pass
     except Exception as e:
-        print(f"Error delivering {filename} to {office}: {e}", file=__import__('sys').stderr)
+        METRICS.inc('mailroom_delivery_errors_total', kind='file')
+        print(f"Error delivering {filename} to {office}: {e}", file=sys.stderr)
         return False
+    METRICS.observe('mailroom_file_delivery_seconds', time.perf_counter() - start)
+    METRICS.inc('mailroom_files_delivered_total', office=office)
+    if size is not None:
+        METRICS.observe('mailroom_file_delivery_bytes', size)
+        METRICS.inc('mailroom_bytes_delivered_total', size, mode=mode)
+    return True
 
 
-def process_files():
+def _inbox_path(office, fname):
+    if office not in VALID_OFFICE_SET:
+        office = DEFAULT_OFFICE
+    return os.path.join(navi_root(), 'offices', office, 'inbox', fname)
+
+
+class DeliveryJournal:
+    """
+    Write-ahead log of file deliveries not yet in the ledger.
+
+    Each batch is journaled as 'plan' entries before anything is placed and
+    as 'commit' entries once delivered, with one fsync per batch for each.
+    The ledger removes the journal whenever it has flushed and synced its
+    own entries, so the file only covers the current run.
+
+    After a crash, replay() records committed deliveries in the ledger and
+    keeps planned ones whose inbox copy is already complete (roll forward).
+    A file already renamed out of NAVI/processed is rolled forward too, and
+    a sidecar left behind is moved after it. Everything else is rolled
+    back: leftover temp files are removed and the next scan delivers the
+    file again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def _write(self, entries):
+        if not entries:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        for entry in entries:
+            self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _entry(op, job):
+        return {'op': op, 'key': job['key'], 'size': job['size'], 'mtime_ns': job['mtime_ns'],
+                'office': job['office'], 'sidecar': job['sidecar_sig'], 'entity': job.get('entity')}
+
+    def plan(self, jobs):
+        """Journal a batch about to be delivered (office is None for shard batches)."""
+        self._write([self._entry('plan', job) for job in jobs])
+
+    def commit(self, jobs):
+        """Journal the delivered jobs of a batch."""
+        self._write([self._entry('commit', job) for job in jobs])
+
+    def reset(self):
+        """Drop the journal once the ledger holds everything it covered."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _intact(entry):
+        """True when the inbox already holds the planned file (and its sidecar)."""
+        dst = _inbox_path(entry['office'], entry['key'].rsplit('/', 1)[-1])
+        try:
+            st = os.stat(dst)
+        except OSError:
+            return False
+        return (st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns']
+                and (not entry['sidecar'] or os.path.exists(dst + '.navi.json')))
+
+    @staticmethod
+    def _moved(entry):
+        """
+        (office, inbox path) of a file renamed out of NAVI/processed before
+        the crash: its source is gone and an inbox copy matches it. Shard
+        entries have no office yet, so every inbox is looked at. None otherwise.
+        """
+        if os.path.lexists(os.path.join(navi_root(), 'processed', entry['key'])):
+            return None
+        fname = entry['key'].rsplit('/', 1)[-1]
+        for office in [entry['office']] if entry['office'] is not None else VALID_OFFICES:
+            dst = _inbox_path(office, fname)
+            try:
+                st = os.stat(dst)
+            except OSError:
+                continue
+            if st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns']:
+                return office, dst
+        return None
+
+    @staticmethod
+    def _finish_move(entry, dst):
+        """Move (or tag) the sidecar a crash left in NAVI/processed after its file."""
+        sidecar = os.path.join(navi_root(), 'processed', entry['key']) + '.navi.json'
+        if not entry['sidecar'] or not os.path.exists(sidecar):
+            return
+        if not os.path.exists(dst + '.navi.json'):
+            if entry.get('entity'):
+                write_tagged_sidecar(sidecar, dst + '.navi.json', entry['entity'])
+            else:
+                place_file(sidecar, dst + '.navi.json', 'rename')
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+
+    @staticmethod
+    def _roll_back(entry):
+        dst = _inbox_path(entry['office'], entry['key'].rsplit('/', 1)[-1])
+        leftovers = [dst + suffix for suffix in TEMP_SUFFIXES]
+        leftovers += [dst + '.navi.json' + suffix for suffix in TEMP_SUFFIXES + ('.tmp',)]
+        for path in leftovers:
+            if os.path.lexists(path):
+                os.remove(path)
+
+    def replay(self, ledger):
+        """
+        Settle an interrupted run into `ledger` and drop the journal.
+        Returns counts of committed, rolled-forward and rolled-back entries.
+        """
+        planned = {}
+        committed = {}
+        for entry in _read_jsonl(self.path):
+            if entry.get('op') == 'commit':
+                committed[entry['key']] = entry
+            elif entry.get('op') == 'plan':
+                planned[entry['key']] = entry
+        counts = {'committed': 0, 'rolled_forward': 0, 'rolled_back': 0}
+        for key, entry in planned.items():
+            if key in committed:
+                continue
+            moved = self._moved(entry)
+            if moved is not None:
+                entry['office'], dst = moved
+                self._finish_move(entry, dst)
+                committed[key] = entry
+                counts['rolled_forward'] += 1
+            elif entry['office'] is not None and self._intact(entry):
+                committed[key] = entry
+                counts['rolled_forward'] += 1
+            else:
+                # Shard batches are planned before their office is known;
+                # their temp files are replaced when the file is redelivered
+                if entry['office'] is not None:
+                    self._roll_back(entry)
+                counts['rolled_back'] += 1
+        counts['committed'] = len(committed) - counts['rolled_forward']
+        for key, entry in committed.items():
+            ledger.record(key, entry['size'], entry['mtime_ns'], entry['office'], entry['sidecar'])
+        ledger.flush()
+        self.reset()
+        return counts
+
+
+class DeliveryLedger:
+    """
+    Append-only record of files already delivered to an office inbox.
+
+    Stored as JSONL under NAVI/metadata (same layout as seen_files.jsonl).
+    Entries are keyed by '<subdir>/<filename>' and carry the size and mtime
+    of the source at delivery time, plus [size, mtime_ns] of its .navi.json
+    sidecar (None without one), so a changed file or a sidecar that arrives
+    or changes later is routed again while untouched history is skipped
+    with a single dict lookup.
+
+    A ledger opened with load() also owns the DeliveryJournal next to it:
+    loading replays what an interrupted run left there, and every flush
+    syncs the ledger and then drops the journal.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._pending = []
+        self.journal = None
+
+    @classmethod
+    def load(cls, path=None):
+        ledger = cls(path or os.path.join(metadata_dir(), LEDGER_FILENAME))
+        lines = 0
+        for entry in _read_jsonl(ledger.path):
+            ledger._entries[entry['key']] = entry
+            lines += 1
+        if lines > 2 * len(ledger._entries) + 1000:
+            ledger.compact()
+        journal = ledger.journal = DeliveryJournal(os.path.join(os.path.dirname(ledger.path), JOURNAL_FILENAME))
+        if os.path.exists(journal.path):
+            counts = journal.replay(ledger)
+            for outcome, n in counts.items():
+                METRICS.inc('mailroom_journal_replayed_total', n, outcome=outcome)
+            print(f"Replayed delivery journal: {counts['committed']} committed, "
+                  f"{counts['rolled_forward']} rolled forward, {counts['rolled_back']} rolled back",
+                  file=sys.stderr)
+        return ledger
+
+    @staticmethod
+    def key(subdir, filename):
+        return subdir + '/' + filename
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """The latest entry for key, or None."""
+        return self._entries.get(key)
+
+    def is_delivered(self, key, size, mtime_ns, sidecar=None):
+        entry = self._entries.get(key)
+        # Entries written before sidecars were tracked match any sidecar
+        return (entry is not None and entry['size'] == size and entry['mtime_ns'] == mtime_ns
+                and entry.get('sidecar', sidecar) == sidecar)
+
+    def record(self, key, size, mtime_ns, office, sidecar=None):
+        entry = {
+            'key': key,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sidecar': sidecar,
+            'office': office,
+            'delivered_at': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        }
+        self._entries[key] = entry
+        self._pending.append(entry)
+
+    def flush(self):
+        """Append entries recorded since the last flush, then drop the journal."""
+        _append_jsonl(self.path, self._pending, fsync=self.journal is not None)
+        self._pending = []
+        if self.journal is not None:
+            self.journal.reset()
+
+    def compact(self):
+        """Rewrite the ledger with one line per key (drops superseded entries)."""
+        _rewrite_jsonl(self.path, self._entries.values())
+        self._pending = []
+
+
+class RouteCache:
+    """
+    Persistent sidecar -> routing decision cache (NAVI/metadata/route_cache.jsonl).
+
+    Keyed by a hash of the sidecar bytes. Each entry keeps the sidecar's
+    route/function value plus the office it mapped to under a given
+    RoutingRules.route_version, so an unchanged sidecar is never JSON-parsed
+    again; after a config change its office is re-derived from the cached
+    route with a table lookup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._pending = []
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path=None):
+        cache = cls(path or os.path.join(metadata_dir(), ROUTE_CACHE_FILENAME))
+        lines = 0
+        for entry in _read_jsonl(cache.path):
+            cache._entries[entry['hash']] = entry
+            lines += 1
+        if lines > 2 * len(cache._entries) + 1000:
+            _rewrite_jsonl(cache.path, cache._entries.values())
+        return cache
+
+    def office_for(self, sidecar, rules):
+        return self.decide(sidecar, rules)[0]
+
+    def decide(self, sidecar, rules):
+        """(office, entity to tag or None, urgency tier or None) for a sidecar, see sidecar_route()."""
+        try:
+            with open(sidecar, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return DEFAULT_OFFICE, None, None
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self.hits += 1
+            if entry.get('version') == rules.route_version and entry.get('tags') == rules.tag_version:
+                return entry['office'], entry.get('entity'), entry.get('urgency')
+        # New sidecars, classified ones whose keywords may have changed and
+        # any whose entity signals or urgency keywords changed are parsed;
+        # routed ones are re-derived from the cached route
+        if entry is None or entry['route'] is None or entry.get('tags') != rules.tag_version:
+            if entry is None:
+                self.misses += 1
+            try:
+                route, function, entity, urgency = sidecar_route(json.loads(data.decode('utf-8')), rules)
+            except Exception:
+                route, function, entity, urgency = None, None, None, None
+            entry = {'hash': digest, 'route': route, 'function': function, 'entity': entity, 'urgency': urgency}
+        entry = dict(entry, office=rules.office_for_route(entry['route'] or entry.get('function')),
+                     version=rules.route_version, tags=rules.tag_version)
+        self._entries[digest] = entry
+        self._pending.append(entry)
+        return entry['office'], entry['entity'], entry.get('urgency')
+
+    def flush(self):
+        _append_jsonl(self.path, self._pending)
+        self._pending = []
+
+    def take_pending(self):
+        pending, self._pending = self._pending, []
+        return pending
+
+    def absorb(self, pending, hits, misses):
+        """Adopt decisions made by a shard worker; this cache writes them out."""
+        for entry in pending:
+            self._entries[entry['hash']] = entry
+        self._pending.extend(pending)
+        self.hits += hits
+        self.misses += misses
+
+
+def sidecar_route(sc, rules):
+    """
+    (route, function, entity, urgency) for a parsed sidecar: its
+    route/function field, or else None and the classifier's pick from its
+    extracted text. `entity` is the tagger's pick when the sidecar names no
+    entity itself; `urgency` is the tier from its fields and text.
+    """
+    text = next((sc[k] for k in SIDECAR_TEXT_FIELDS if isinstance(sc.get(k), str) and sc[k]), None)
+    entity = None if sc.get('entity') else rules.tag_entity(text)
+    filename = sc.get('filename') if isinstance(sc.get('filename'), str) else None
+    urgency = rules.urgency(text, filename, sc)
+    route = sc.get('route') or sc.get('function')
+    if isinstance(route, str) and route:
+        return route, None, entity, urgency
+    return None, rules.classify(text, filename), entity, urgency
+
+
+def read_text_sample(path):
+    """First MAX_CLASSIFY_CHARS characters of a text-like file, else None."""
+    if os.path.splitext(path)[1].lower() not in TEXT_EXTENSIONS:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read(MAX_CLASSIFY_CHARS)
+    except OSError:
+        return None
+
+
+def route_file(fname, sidecar, config, cache=None, src=None):
+    """
+    Decide the office for one processed file.
+    Filename override first, then sidecar route/function, then the keyword
+    classifier (sidecar text, or the file itself when `src` is text-like),
+    then EXEC. With a RouteCache, sidecar decisions are served from the cache.
+    """
+    return decide_file(fname, sidecar, config, cache, src)[0]
+
+
+def decide_file(fname, sidecar, config, cache=None, src=None):
+    """
+    route_file() plus the entity and urgency tier read from the same text:
+    (office, entity or None, urgency or None).
+    """
+    rules = compile_rules(config)
+    # 1. Check filename override FIRST
+    override = rules.override_for(fname)
+
+    # 2. If no override, check sidecar
+    if sidecar:
+        if cache is not None:
+            office, entity, urgency = cache.decide(sidecar, rules)
+        else:
+            try:
+                with open(sidecar, 'r', encoding='utf-8') as f:
+                    route, function, entity, urgency = sidecar_route(json.load(f), rules)
+                office = rules.office_for_route(route or function)
+            except Exception:
+                office, entity, urgency = DEFAULT_OFFICE, None, None
+        # The sidecar's own filename may differ; the real one counts too
+        urgency = max(filter(None, (urgency, rules.urgency(None, fname))), key=URGENCY_RANKS.get, default=None)
+        return override or office, entity, urgency
+
+    # 3. No sidecar: classify the file's own text (EXEC when nothing matches)
+    text = read_text_sample(src) if src is not None else None
+    entity = rules.tag_entity(text)
+    urgency = rules.urgency(text, fname)
+    if override:
+        return override, entity, urgency
+    return rules.office_for_route(rules.classify(text, fname)), entity, urgency
+
+
+def _sidecar_signature(st):
+    """Ledger signature of a sidecar's stat: [size, mtime_ns]."""
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _scan_processed(processed_dir):
+    """
+    Single os.scandir pass over NAVI/processed, newest subdir first.
+
+    Yields (subdir, name, path, stat, sidecar, sidecar_sig) per base file.
+    Each subdir is listed once into a name -> DirEntry map; file types come
+    from the cached DirEntry and sidecars are paired from the map, so the
+    only syscalls per file are the stats needed for the ledger. `sidecar`
+    and `sidecar_sig` are None when absent.
+    """
+    with os.scandir(processed_dir) as it:
+        subdirs = sorted((e.name for e in it if e.is_dir()), reverse=True)
+
+    for subdir in subdirs:
+        try:
+            with os.scandir(os.path.join(processed_dir, subdir)) as it:
+                entries = {e.name: e for e in it}
+        except OSError:
+            continue
+        for name, entry in entries.items():
+            # Skip sidecars, process base files only
+            if name.endswith(SIDECAR_SUFFIXES) or not entry.is_file():
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            sidecar = entries.get(name + '.navi.json')
+            try:
+                sidecar_sig = _sidecar_signature(sidecar.stat()) if sidecar else None
+            except OSError:
+                sidecar, sidecar_sig = None, None
+            yield subdir, name, entry.path, st, sidecar.path if sidecar else None, sidecar_sig
+
+
+def _scan_changed(processed_dir, candidates):
+    """Like _scan_processed() but for changed (subdir, name) paths, sidecars included."""
+    bases = set()
+    for subdir, fname in candidates:
+        for suffix in SIDECAR_SUFFIXES:
+            if fname.endswith(suffix):
+                fname = fname[:-len(suffix)]
+                break
+        bases.add((subdir, fname))
+
+    # Same order as a full walk: newest subdir first
+    for subdir, name in sorted(bases, reverse=True):
+        path = os.path.join(processed_dir, subdir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        sidecar = path + '.navi.json'
+        try:
+            sidecar_sig = _sidecar_signature(os.stat(sidecar))
+        except OSError:
+            sidecar, sidecar_sig = None, None
+        yield subdir, name, path, st, sidecar, sidecar_sig
+
+
+def _retire_earlier_copy(entry, job):
+    """
+    Remove the inbox copy (and sidecar) an earlier delivery of job's file
+    left in another office, now that a sidecar that arrived or changed has
+    routed it elsewhere. Only a copy that still matches the ledger `entry`
+    is removed, never a newer file that happens to share its name.
+    """
+    if entry is None or _inbox_path(entry['office'], job['fname']) == _inbox_path(job['office'], job['fname']):
+        return
+    dst = _inbox_path(entry['office'], job['fname'])
+    try:
+        st = os.stat(dst)
+    except OSError:
+        return
+    if st.st_size != entry['size'] or st.st_mtime_ns != entry['mtime_ns']:
+        return
+    for path in (dst, dst + '.navi.json'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def plan_deliveries(processed_dir, ledger, config, force=False, counters=None, candidates=None,
+                    route_cache=None, decide=True):
+    """
+    Yield one delivery job per processed file that still needs delivering.
+    Subdirs are walked newest first; ledger hits are counted as 'skipped'.
+    `candidates` limits planning to those (subdir, name) paths instead of
+    walking the whole tree. With decide=False the routing decision is left
+    to the caller ('office', 'entity' and 'urgency' are None; see decide_jobs()).
+    """
+    if candidates is None:
+        entries = _scan_processed(processed_dir)
+    else:
+        entries = _scan_changed(processed_dir, candidates)
+    for subdir, fname, src, st, sidecar, sidecar_sig in entries:
+        key = DeliveryLedger.key(subdir, fname)
+        if not force and ledger.is_delivered(key, st.st_size, st.st_mtime_ns, sidecar_sig):
+            if counters is not None:
+                counters['skipped'] = counters.get('skipped', 0) + 1
+            continue
+        
+        office, entity, urgency = decide_file(fname, sidecar, config, route_cache, src) if decide else (None, None, None)
+        yield {
+            'key': key,
+            'fname': fname,
+            'src': src,
+            'sidecar': sidecar,
+            'sidecar_sig': sidecar_sig,
+            'office': office,
+            'entity': entity,
+            'urgency': urgency,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+        }
+
+
+def decide_jobs(jobs, config, route_cache=None):
+    """Fill in 'office' and 'entity' for jobs planned with decide=False."""
+    for job in jobs:
+        job['office'], job['entity'], job['urgency'] = decide_file(job['fname'], job['sidecar'], config,
+                                                                   route_cache, job['src'])
+    return jobs
+
+
+def shard_count(config):
+    """Process shards for process_files (routing_config.json: mailroom.shards; 1 = no pool)."""
+    try:
+        shards = int((config.get('mailroom') or {}).get('shards', 1))
+    except (TypeError, ValueError):
+        shards = 1
+    return max(1, shards)
+
+
+def shard_of(fname, shards):
+    """Shard for a filename. Files sharing a name share a shard, so they keep scan order."""
+    return zlib.crc32(fname.encode('utf-8', 'surrogatepass')) % shards
+
+
+# Per-process state of a shard worker (see _shard_init)
+_shard = {}
+
+
+def _shard_init(root, raw_config, mode, cache_path, dedupe):
+    os.environ['NAVI_ROOT'] = root
+    _shard.update(
+        rules=RoutingRules(raw_config),
+        mode=mode,
+        cache=RouteCache.load(cache_path) if cache_path else None,
+        store=BlobStore.load() if dedupe else None,
+    )
+    METRICS.reset()
+
+
+def _shard_run(jobs):
+    """
+    Decide and deliver one shard's jobs, in order, inside a pool process.
+    Returns the office per job (None when delivery failed) plus the cache,
+    blob index and metrics updates for the parent to merge.
+    """
+    rules, mode, cache, store = _shard['rules'], _shard['mode'], _shard['cache'], _shard['store']
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    offices = []
+    for job in jobs:
+        office, entity, urgency = decide_file(job['fname'], job['sidecar'], rules, cache, job['src'])
+        ok = deliver_to_office(job['src'], job['sidecar'], office, mode, store, job['size'], entity)
+        if ok:
+            observe_time_to_inbox(job['mtime_ns'], urgency)
+        offices.append(office if ok else None)
+    return {
+        'offices': offices,
+        'cache': (cache.take_pending(), cache.hits - hits, cache.misses - misses) if cache is not None else None,
+        'blobs': (store.take_pending(), store.take_stats()) if store is not None else None,
+        'metrics': METRICS.drain(),
+    }
+
+
+class ShardPool:
+    """
+    Process pool that routes and delivers batches of planned jobs.
+
+    Jobs are bucketed by a hash of their filename. Each bucket runs in
+    order in one worker, which recompiles the routing rules from the raw
+    config once. The parent merges the results back into job order and
+    stays the only writer of the ledger, route cache and blob index. Every
+    job goes to exactly one worker.
+
+    Workers are started by the first run() and live until close(), so the
+    daemon keeps one pool (see matches()) rather than forking and reloading
+    the route cache and blob index every cycle.
+    """
+
+    def __init__(self, shards, config, mode, route_cache=None, store=None):
+        self.shards = shards
+        self.config = config
+        self.mode = mode
+        self._route_cache = route_cache
+        self._store = store
+        self._executor = None
+
+    def matches(self, shards, config, mode, route_cache, store):
+        """True when this pool was built for these settings and can be reused."""
+        return (self.shards == shards and self.config is config and self.mode == mode
+                and self._route_cache is route_cache and self._store is store)
+
+    def _start(self):
+        if self._route_cache is not None:
+            self._route_cache.flush()  # workers load the cache from disk
+        if self._store is not None:
+            self._store.flush()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.shards, initializer=_shard_init,
+            initargs=(navi_root(), dict(self.config), self.mode,
+                      self._route_cache.path if self._route_cache is not None else None,
+                      self._store is not None))
+
+    def run(self, jobs):
+        """Route and deliver jobs; sets job['office'] and returns one success flag per job."""
+        if self._executor is None:
+            self._start()
+        buckets = [[] for _ in range(self.shards)]
+        for i, job in enumerate(jobs):
+            buckets[shard_of(job['fname'], self.shards)].append(i)
+        futures = [(self._executor.submit(_shard_run, [jobs[i] for i in idx]), idx) for idx in buckets if idx]
+        results = [False] * len(jobs)
+        for future, idx in futures:
+            result = future.result()
+            for i, office in zip(idx, result['offices']):
+                jobs[i]['office'] = office
+                results[i] = office is not None
+            if result['cache'] is not None and self._route_cache is not None:
+                self._route_cache.absorb(*result['cache'])
+            if result['blobs'] is not None and self._store is not None:
+                self._store.absorb(*result['blobs'])
+            METRICS.merge(result['metrics'])
+        return results
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def delivery_workers(config):
+    """Worker count for the delivery pool (routing_config.json: mailroom.delivery_workers)."""
+    try:
+        workers = int((config.get('mailroom') or {}).get('delivery_workers', DEFAULT_DELIVERY_WORKERS))
+    except (TypeError, ValueError):
+        workers = DEFAULT_DELIVERY_WORKERS
+    return max(1, workers)
+
+
+def observe_time_to_inbox(mtime_ns, urgency):
+    """Time from a file landing in NAVI/processed (its mtime) to its inbox delivery."""
+    METRICS.observe('mailroom_time_to_inbox_seconds', max(0.0, time.time() - mtime_ns / 1e9),
+                    urgency=urgency or 'routine')
+
+
+_notices = set()
+
+
+def notice_once(message):
+    """Print message to stderr the first time it comes up in this process."""
+    if message not in _notices:
+        _notices.add(message)
+        print(message, file=sys.stderr)
+
+
+def priority_window(config):
+    """Jobs the urgency queue looks ahead over (routing_config.json: mailroom.priority_window)."""
+    try:
+        window = int((config.get('mailroom') or {}).get('priority_window', DEFAULT_PRIORITY_WINDOW))
+    except (TypeError, ValueError):
+        window = DEFAULT_PRIORITY_WINDOW
+    return max(1, window)
+
+
+class UrgencyQueue:
+    """
+    Bounded priority queue between planning and delivery.
+
+    Keeps up to `window` planned jobs in a heap and hands out batches most
+    urgent tier first (see URGENCY_RANKS), scan order within a tier. When
+    everything pending fits in the window, urgent mail is delivered before
+    any routine file; beyond that it overtakes the next `window` jobs.
+    """
+
+    def __init__(self, jobs, window=DEFAULT_PRIORITY_WINDOW):
+        self._jobs = jobs
+        self._window = window
+        self._heap = []
+        self._seq = count()
+
+    def next_batch(self, size):
+        while len(self._heap) < self._window:
+            job = next(self._jobs, None)
+            if job is None:
+                break
+            heapq.heappush(self._heap, (-URGENCY_RANKS.get(job['urgency'], 0), next(self._seq), job))
+        return [heapq.heappop(self._heap)[2] for _ in range(min(size, len(self._heap)))]
+
+
+def _deliver_chain(jobs, mode, store):
+    results = []
+    for job in jobs:
+        ok = deliver_to_office(job['src'], job['sidecar'], job['office'], mode, store, job['size'], job.get('entity'))
+        if ok:
+            observe_time_to_inbox(job['mtime_ns'], job.get('urgency'))
+        results.append(ok)
+    return results
+
+
+def deliver_batch(jobs, executor=None, mode='copy', store=None):
+    """
+    Deliver a batch of jobs and return one success flag per job, in job order.
+
+    Jobs bound for the same office run sequentially, in plan order, on a
+    single worker; different offices are delivered in parallel.
+    """
+    if executor is None:
+        return _deliver_chain(jobs, mode, store)
+    chains = {}  # office -> [job index]
+    for i, job in enumerate(jobs):
+        chains.setdefault(job['office'], []).append(i)
+    futures = [(executor.submit(_deliver_chain, [jobs[i] for i in idx], mode, store), idx) for idx in chains.values()]
+    results = [False] * len(jobs)
+    for future, idx in futures:
+        for i, ok in zip(idx, future.result()):
+            results[i] = ok
+    return results
+
+
+def file_record(job):
+    """One NDJSON routing decision for a delivered job."""
+    record = {'type': 'file', 'file': job['fname'], 'key': job['key'], 'office': job['office'],
+              'size': job['size']}
+    if job.get('entity'):
+        record['entity'] = job['entity']
+    if job.get('urgency'):
+        record['urgency'] = job['urgency']
+    return record
+
+
+def ndjson_writer(out=None):
+    """emit callable for process_files: one JSON line per record, flushed per batch."""
+    def emit(records):
+        stream = out or sys.stdout
+        stream.write(''.join(json.dumps(record) + '\n' for record in records))
+        stream.flush()
+    return emit
+
+
+def process_files(ledger=None, force=False, stats=None, config=None, candidates=None, store=None,
+                  route_cache=None, shards=None, emit=None, pool=None):
     """
     Process all files in NAVI/processed subdirectories.
     Routes each to the correct office based on sidecar or filename override.
+    Single-process runs deliver through an UrgencyQueue, so files scored
+    urgent, past due or high go out before routine ones. Sharded runs do no
+    urgency scheduling.
+
+    Files already recorded in the delivery ledger with the same size and
+    mtime (and the same sidecar) are skipped; pass force=True to deliver them again.
+    A file routed to a new office drops the copy its ledger entry left in the
+    old one (see _retire_earlier_copy()). When `stats`
+    is a dict, 'skipped' is set to the number of files skipped. A ledger
+    passed in by the caller is not flushed here. `candidates` restricts the
+    run to changed (subdir, name) paths, as reported by IntakeWatcher.
+
+    When mailroom.dedupe_store is enabled, files go through a BlobStore
+    (the caller's `store`, or one opened for this run) and stats['dedupe']
+    reports hits and bytes saved. Sidecar decisions go through
+    `route_cache` (a RouteCache is loaded for the run when not given).
+
+    Each batch is planned and committed in the ledger's DeliveryJournal,
+    so a crash mid-run is settled when the next run loads the ledger.
+
+    With more than one shard (`shards`, else mailroom.shards) routing and
+    delivery of large batches run on a ShardPool of processes: the caller's
+    `pool` when it matches this run, else one started and closed here. The same
+    files reach the same offices as in a single-process run, but in scan
+    order: urgency is only known once a worker has routed a file, so
+    nothing is scheduled ahead (noted once per process on stderr).
+
+    With an `emit` callable, each delivered batch is passed to it as a list
+    of file_record()s instead of being collected: the returned list and map
+    stay empty and stats['routed_counts'] gets the per-office counts, so
+    memory does not grow with the number of files.
     """
-    config = load_config()
+    if config is None:
+        config = load_config()
     routed = []
     routing_details = {}  # office -> [files]
+    routed_counts = {}  # office -> n, when streaming to `emit`
+    counters = {'skipped': 0}
     
-    processed_dir = PROCESSED_DIR
-    offices_dir = os.path.join(NAVI_ROOT, 'offices')
+    processed_dir = os.path.join(navi_root(), 'processed')
 
     if not os.path.exists(processed_dir):
         return routed, routing_details
-    
-    # Walk processed subdirs (newest first)
-    subdirs = sorted(
-        [d for d in os.listdir(processed_dir) if os.path.isdir(os.path.join(processed_dir, d))],
-        reverse=True
-    )
-    
-    for subdir in subdirs:
-        subdir_path = os.path.join(processed_dir, subdir)
-        
-        for fname in os.listdir(subdir_path):
-            # Skip sidecars, process base files only
-            if fname.endswith('.navi.json') or fname.endswith('.meta.json'):
-                continue
-            
-            src = os.path.join(subdir_path, fname)
-            if not os.path.isfile(src):
-                continue
-            
-            sidecar = src + '.navi.json'
-            
-            # 1. Check filename override FIRST
-            office = check_filename_override(fname, config)
-            
-            # 2. If no override, check sidecar
-            if not office and os.path.exists(sidecar):
-                try:
-                    with open(sidecar, 'r', encoding='utf-8') as f:
-                        sc = json.load(f)
-                        route = sc.get('route') or sc.get('function')
-                        office = get_office_from_route(route, config)
-                except Exception:
-                    office = DEFAULT_OFFICE
-            
-            # 3. Default to EXEC
-            if not office:
-                office = DEFAULT_OFFICE
-            
-            # Deliver
-            if deliver_to_office(src, sidecar, office):
-                routed.append(fname)
+
+    own_ledger = ledger is None
+    if own_ledger:
+        ledger = DeliveryLedger.load()
+    own_store = store is None and dedupe_enabled(config)
+    if own_store:
+        store = BlobStore.load()
+    own_cache = route_cache is None
+    if own_cache:
+        route_cache = RouteCache.load()
+
+    journal = ledger.journal
+    mode = delivery_mode(config)
+    workers = delivery_workers(config)
+    shards = shard_count(config) if shards is None else max(1, shards)
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    if pool is not None and not pool.matches(shards, config, mode, route_cache, store):
+        pool = None
+    own_pool = pool is None
+    cache_hits, cache_misses = route_cache.hits, route_cache.misses
+    # Planning (listing + sidecar routing) is interleaved with delivery, so
+    # the two are timed per batch and reported as separate stages.
+    plan_seconds = deliver_seconds = 0.0
+    started = time.perf_counter()
+    try:
+        jobs = plan_deliveries(processed_dir, ledger, config, force=force, counters=counters,
+                               candidates=candidates, route_cache=route_cache, decide=shards == 1)
+        queue = UrgencyQueue(jobs, priority_window(config)) if shards == 1 else None
+        if queue is None:
+            notice_once('Sharded delivery: urgency scheduling is bypassed, files are delivered in scan order')
+        while True:
+            t0 = time.perf_counter()
+            if queue is not None:
+                batch = queue.next_batch(DELIVERY_BATCH_SIZE)
+            else:
+                batch = list(islice(jobs, DELIVERY_BATCH_SIZE))
+            if shards > 1 and len(batch) < SHARD_MIN_BATCH:
+                decide_jobs(batch, config, route_cache)
+            t1 = time.perf_counter()
+            plan_seconds += t1 - t0
+            if not batch:
+                break
+            if journal is not None:
+                journal.plan(batch)
+            if batch[0]['office'] is None:
+                if pool is None:
+                    pool = ShardPool(shards, config, mode, route_cache, store)
+                results = pool.run(batch)
+            else:
+                results = deliver_batch(batch, executor, mode, store)
+            delivered = [job for job, ok in zip(batch, results) if ok]
+            if journal is not None:
+                journal.commit(delivered)
+            for job in delivered:
+                _retire_earlier_copy(ledger.get(job['key']), job)
+            deliver_seconds += time.perf_counter() - t1
+            if emit is not None:
+                for job in delivered:
+                    routed_counts[job['office']] = routed_counts.get(job['office'], 0) + 1
+                    ledger.record(job['key'], job['size'], job['mtime_ns'], job['office'], job['sidecar_sig'])
+                if delivered:
+                    emit([file_record(job) for job in delivered])
+                continue
+            for job in delivered:
+                office = job['office']
+                ledger.record(job['key'], job['size'], job['mtime_ns'], office, job['sidecar_sig'])
+                routed.append(job['fname'])
                 if office not in routing_details:
                     routing_details[office] = []
-                routing_details[office].append(fname)
+                routing_details[office].append(job['fname'])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if own_pool and pool is not None:
+            pool.close()
+
+    if own_ledger:
+        ledger.flush()
+    if own_store:
+        store.flush()
+    if own_cache:
+        route_cache.flush()
+
+    METRICS.observe('mailroom_stage_seconds', plan_seconds, stage='plan')
+    METRICS.observe('mailroom_stage_seconds', deliver_seconds, stage='deliver')
+    METRICS.observe('mailroom_stage_seconds', time.perf_counter() - started, stage='process_files')
+    METRICS.inc('mailroom_files_skipped_total', counters['skipped'])
+    METRICS.inc('mailroom_route_cache_total', route_cache.hits - cache_hits, result='hit')
+    METRICS.inc('mailroom_route_cache_total', route_cache.misses - cache_misses, result='miss')
+    if stats is not None:
+        stats['skipped'] = counters['skipped']
+        if emit is not None:
+            stats['routed_counts'] = routed_counts
+        if own_store:
+            stats['dedupe'] = store.take_stats()
     
     return routed, routing_details
 
 
-def process_packages():
+class PackageIntegrityError(Exception):
+    """A package does not (yet) match its manifest.json."""
+
+
+def _copy_hashed(src, dst):
+    """shutil.copy2() that also returns the sha256 of the bytes copied."""
+    h = hashlib.sha256()
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for chunk in iter(lambda: fsrc.read(1024 * 1024), b''):
+            h.update(chunk)
+            fdst.write(chunk)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def package_manifest(pkg_path):
+    """
+    filename -> expected sha256 (None when not given) from manifest.json; {}
+    without one. A filename that is absolute or has a '..' component would
+    reach outside the package, so the whole manifest is refused.
+    """
+    try:
+        with open(os.path.join(pkg_path, 'manifest.json'), 'r', encoding='utf-8') as f:
+            files = json.load(f).get('files') or []
+        expected = {entry['filename']: (entry.get('sha256') or '').lower() or None
+                    for entry in files if entry.get('filename')}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        # Most likely still being written by the packager
+        raise PackageIntegrityError(f'unreadable manifest.json: {e}')
+    for rel in expected:
+        if not isinstance(rel, str) or os.path.isabs(rel) or '..' in rel.replace('\\', '/').split('/'):
+            raise PackageIntegrityError(f'manifest.json names a file outside the package: {rel!r}')
+    return expected
+
+
+def _package_signature(pkg_path):
+    """(size, mtime_ns) kept in the ledger for a package: manifest size, newest of dir/manifest mtime."""
+    st = os.stat(pkg_path)
+    try:
+        mst = os.stat(os.path.join(pkg_path, 'manifest.json'))
+    except FileNotFoundError:
+        return 0, st.st_mtime_ns
+    return mst.st_size, max(st.st_mtime_ns, mst.st_mtime_ns)
+
+
+def _walk_files(top):
+    """Relative paths of every file under top, sorted per directory."""
+    found = []
+    for root, dirs, files in os.walk(top):
+        dirs.sort()
+        rel = os.path.relpath(root, top)
+        found.extend(name if rel == '.' else os.path.join(rel, name) for name in sorted(files))
+    return found
+
+
+def _check_manifest(expected, *trees):
+    missing = [f for f in expected if not any(os.path.exists(os.path.join(t, f)) for t in trees)]
+    if missing:
+        raise PackageIntegrityError(f'{len(missing)} manifest file(s) missing, e.g. {missing[0]}')
+
+
+def _deliver_package_file(src, dst, mode, store, expected):
+    """
+    Place one package file and return its sha256 (None when it was not
+    worth hashing). Raises PackageIntegrityError on a manifest mismatch,
+    before a bad file is moved or linked anywhere.
+    """
+    if mode == 'copy' and store is None:
+        digest = _copy_hashed(src, dst)
+        if expected and digest != expected:
+            os.remove(dst)
+    else:
+        digest = _sha256_file(src) if expected or store is not None else None
+        if not expected or digest == expected:
+            if store is not None:
+                store.deliver(src, dst, mode, digest)
+            else:
+                place_file(src, dst, mode)
+    if expected and digest != expected:
+        raise PackageIntegrityError(f'{os.path.basename(src)}: sha256 {digest} does not match the manifest')
+    return digest
+
+
+def _stage_package(pkg_path, staging, mode, store, expected):
+    """Assemble pkg_path under staging, skipping files an earlier attempt already staged."""
+    progress_path = staging + PROGRESS_SUFFIX
+    done = {entry['file']: entry for entry in _read_jsonl(progress_path)}
+    os.makedirs(staging, exist_ok=True)
+    with open(progress_path, 'a', encoding='utf-8') as log:
+        for rel in _walk_files(pkg_path):
+            src = os.path.join(pkg_path, rel)
+            dst = os.path.join(staging, rel)
+            st = os.stat(src)
+            entry = done.get(rel)
+            if (entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns
+                    and os.path.exists(dst)):
+                continue
+            if os.sep in rel:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+            digest = _deliver_package_file(src, dst, mode, store, expected.get(rel))
+            METRICS.inc('mailroom_package_files_staged_total')
+            METRICS.inc('mailroom_package_bytes_staged_total', st.st_size)
+            log.write(json.dumps({'file': rel, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                  'sha256': digest}) + '\n')
+            log.flush()
+
+
+def _deliver_package(pkg_path, dest, mode, store):
+    """
+    Deliver a package directory to dest (which must not exist yet).
+
+    The package lands in the inbox in one rename: either the package dir
+    itself (rename mode) or a staging copy that was verified against the
+    manifest. Interrupted copies resume from their progress log.
+    """
+    expected = package_manifest(pkg_path)
+    staging = os.path.join(os.path.dirname(os.path.dirname(dest)), STAGING_DIRNAME, os.path.basename(dest))
+    _check_manifest(expected, pkg_path, staging)
+    if mode == 'rename' and store is None and not os.path.exists(staging):
+        for rel, want in expected.items():
+            if want and _sha256_file(os.path.join(pkg_path, rel)) != want:
+                raise PackageIntegrityError(f'{rel}: sha256 does not match the manifest')
+        try:
+            os.rename(pkg_path, dest)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        mode = 'copy'
+    _stage_package(pkg_path, staging, mode, store, expected)
+    os.rename(staging, dest)
+    os.remove(staging + PROGRESS_SUFFIX)
+    if mode == 'rename':
+        shutil.rmtree(pkg_path, ignore_errors=True)
+
+
+def _repair_package(pkg_path, dest, mode, store):
+    """
+    Bring an inbox copy the ledger does not vouch for in line with its
+    source (e.g. left by an interrupted copytree). Returns files replaced.
+    """
+    expected = package_manifest(pkg_path)
+    _check_manifest(expected, pkg_path, dest)
+    repaired = 0
+    for rel in _walk_files(pkg_path):
+        src = os.path.join(pkg_path, rel)
+        dst = os.path.join(dest, rel)
+        want = expected.get(rel)
+        try:
+            intact = (os.path.getsize(dst) == os.path.getsize(src)
+                      and (not want or _sha256_file(dst) == want))
+        except FileNotFoundError:
+            intact = False
+        if intact:
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        part = dst + '.navi-repair'
+        _deliver_package_file(src, part, mode, store, want)
+        os.replace(part, dst)
+        repaired += 1
+    return repaired
+
+
+def process_packages(config=None, stats=None, names=None, store=None, ledger=None):
     """
     Deliver packages from NAVI/packages to office inboxes.
     Package naming: OFFICE_BATCH-XXXX_YYYYMMDD
+
+    Returns every package present in an inbox; when `stats` is a dict,
+    'new' is set to the number delivered by this call, 'repaired' to the
+    number of existing inbox copies fixed up and 'incomplete' to packages
+    held back because they do not match their manifest. `names` limits the
+    run to those packages instead of listing NAVI/packages. Package files
+    go through the BlobStore like single files when dedupe is enabled.
+
+    Delivered packages are recorded in the delivery ledger under
+    'packages/<name>'. An inbox copy whose entry no longer matches its
+    source is verified against it and repaired. One with no entry at all
+    predates the ledger (or a run that stopped before flushing it): it is
+    recorded as it stands, since files missing from it may have been filed
+    away by a reviewer.
     """
-    packages_dir = PACKAGES_DIR
+    if config is None:
+        config = load_config()
+    mode = delivery_mode(config)
+    packages_dir = os.path.join(navi_root(), 'packages')
     if not os.path.exists(packages_dir):
         return []
+    own_store = store is None and dedupe_enabled(config)
+    if own_store:
+        store = BlobStore.load()
+    own_ledger = ledger is None
+    if own_ledger:
+        ledger = DeliveryLedger.load()
+    started = time.perf_counter()
     
     delivered = []
+    new = 0
+    repaired = 0
+    incomplete = []
     
-    for name in os.listdir(packages_dir):
+    for name in (os.listdir(packages_dir) if names is None else sorted(names)):
         pkg_path = os.path.join(packages_dir, name)
         if not os.path.isdir(pkg_path):
             continue
@@ -187,68 +2091,541 @@ def process_packages():
             continue
         
         office = name.split('_BATCH-')[0]
-        if office not in VALID_OFFICES:
+        if office not in VALID_OFFICE_SET:
             continue
         
-        inbox = os.path.join(ROOT, 'NAVI', 'offices', office, 'inbox')
+        inbox = os.path.join(navi_root(), 'offices', office, 'inbox')
         os.makedirs(inbox, exist_ok=True)
         
         dest = os.path.join(inbox, name)
-        if os.path.exists(dest):
-            # Already delivered
-            delivered.append(name)
-            continue
-        
+        key = DeliveryLedger.key('packages', name)
+        t0 = time.perf_counter()
         try:
-            shutil.copytree(pkg_path, dest)
+            size, mtime_ns = _package_signature(pkg_path)
+            if os.path.exists(dest):
+                if key not in ledger:
+                    print(f"Recording inbox package {name} delivered before the ledger; not repairing it",
+                          file=sys.stderr)
+                    ledger.record(key, size, mtime_ns, office)
+                elif not ledger.is_delivered(key, size, mtime_ns):
+                    if _repair_package(pkg_path, dest, mode, store):
+                        repaired += 1
+                        METRICS.inc('mailroom_packages_repaired_total')
+                    ledger.record(key, size, mtime_ns, office)
+                delivered.append(name)
+                continue
+            _deliver_package(pkg_path, dest, mode, store)
+            ledger.record(key, size, mtime_ns, office)
             delivered.append(name)
-        except Exception:
-            continue
+            new += 1
+            METRICS.observe('mailroom_package_delivery_seconds', time.perf_counter() - t0)
+            METRICS.inc('mailroom_packages_delivered_total', office=office)
+        except PackageIntegrityError as e:
+            incomplete.append(name)
+            METRICS.inc('mailroom_packages_held_total')
+            print(f"Holding package {name}: {e}", file=sys.stderr)
+        except Exception as e:
+            METRICS.inc('mailroom_delivery_errors_total', kind='package')
+            print(f"Error delivering package {name} to {office}: {e}", file=sys.stderr)
+
+    if own_store:
+        store.flush()
+    if own_ledger:
+        ledger.flush()
+    METRICS.observe('mailroom_stage_seconds', time.perf_counter() - started, stage='process_packages')
+    if stats is not None:
+        stats['new'] = new
+        stats['repaired'] = repaired
+        stats['incomplete'] = incomplete
+        if own_store:
+            stats['dedupe'] = store.take_stats()
     
     return delivered
 
 
-def main():
-    """Main entry point."""
-    # Process packages first
-    packages = process_packages()
-    
-    # Process individual files
-    routed, routing_details = process_files()
-    
-    # Output summary
+def _present_generator():
+    """Import scripts/generate_present_page.py once per ROOT (None when absent)."""
+    gen = os.path.join(ROOT, 'scripts', 'generate_present_page.py')
+    if _present['path'] != gen:
+        if not os.path.exists(gen):
+            return None
+        spec = importlib.util.spec_from_file_location('generate_present_page', gen)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _present.update(path=gen, module=module, snapshot=None)
+    return _present['module']
+
+
+def regenerate_present_page(routing_details=None, packages=None, full=True):
+    """
+    Regenerate the present page for humans, in-process.
+
+    With full=False and a snapshot kept from an earlier call (daemon mode),
+    only this run's routing results are applied to it; otherwise the
+    generator re-lists the office inboxes whose fingerprint changed.
+    """
+    try:
+        gen = _present_generator()
+        if gen is None:
+            return
+        snapshot = None if full else _present['snapshot']
+        gen_stats = {}
+        with METRICS.timer('present_page'):
+            out_path, _present['snapshot'] = gen.generate(navi_root(), snapshot, routing_details, packages, gen_stats)
+        status = f"ok {out_path} ({len(gen_stats.get('rerendered', []))} cards re-rendered)"
+    except Exception as e:
+        _present['snapshot'] = None
+        METRICS.inc('mailroom_present_page_errors_total')
+        status = f"failed: {e}"
+        # surface failure to stderr so CI can detect failures
+        print(f"Present page generator failed: {e}", file=sys.stderr)
+
+    log_path = os.path.join(navi_root(), 'logs', 'present_gen.log')
+    try:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, 'a', encoding='utf-8') as lf:
+            lf.write(f"[{datetime.now(timezone.utc).isoformat()}] generator {status}\n")
+    except Exception:
+        pass
+
+
+def build_summary(routed, packages, routing_details, stats):
     output = {
         'status': 'success',
         'routed_files': routed,
         'packages_delivered': packages,
         'routing_summary': routing_details,
+        'skipped_files': stats.get('skipped', 0),
         'timestamp': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
     }
+    if 'dedupe' in stats:
+        output['dedupe'] = stats['dedupe']
+    if stats.get('incomplete_packages'):
+        output['incomplete_packages'] = stats['incomplete_packages']
+    return output
+
+
+def build_stream_summary(packages, stats):
+    """Closing NDJSON record: build_summary() with counts in place of file lists."""
+    counts = stats.get('routed_counts', {})
+    output = build_summary(None, packages, None, stats)
+    del output['routed_files'], output['routing_summary']
+    output['type'] = 'summary'
+    output['routed_count'] = sum(counts.values())
+    output['routing_counts'] = counts
+    return output
+
+
+class IntakeChanges:
+    """Paths reported by IntakeWatcher since the last collect()."""
+
+    __slots__ = ('files', 'packages', 'config', 'overflow')
+
+    def __init__(self):
+        self.files = set()      # (subdir, name) under NAVI/processed
+        self.packages = set()   # package names under NAVI/packages
+        self.config = False     # routing_config.json touched
+        self.overflow = False   # kernel queue overflowed; a full sweep is needed
+
+    def __bool__(self):
+        return bool(self.files or self.packages or self.config or self.overflow)
+
+
+class IntakeWatcher:
+    """
+    inotify-backed intake for NAVI/processed, NAVI/packages and NAVI/config.
+
+    Watches processed/ for new subdirs, every processed subdir for
+    close-write/moved-in files, and packages/ for new package dirs, so the
+    daemon only looks at paths that changed. A package dir moved in is
+    reported at once; one created in place is still being written, so it is
+    watched in turn and reported when its manifest.json is closed or moved
+    in (packages without a manifest wait for the reconciliation sweep).
+    Linux only: create() returns None elsewhere (or when inotify is
+    unavailable) and callers poll instead.
+    """
+
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self._fd = fd
+        self._watches = {}  # wd -> (kind, path, subdir)
+        self._paths = {}    # path -> wd
+
+    @classmethod
+    def create(cls):
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        watcher = cls(libc, fd)
+        watcher.sync()
+        return watcher
+
+    def close(self):
+        os.close(self._fd)
+
+    def _add(self, path, mask, kind, subdir=None):
+        if path in self._paths:
+            return False
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            return False
+        self._watches[wd] = (kind, path, subdir)
+        self._paths[path] = wd
+        return True
+
+    def _remove(self, path):
+        wd = self._paths.pop(path, None)
+        if wd is not None:
+            del self._watches[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def sync(self):
+        """Add watches for directories that appeared since the last sync."""
+        root = navi_root()
+        processed_dir = os.path.join(root, 'processed')
+        self._add(os.path.dirname(config_path()), IN_CLOSE_WRITE | IN_MOVED_TO, 'config')
+        self._add(os.path.join(root, 'packages'), IN_CREATE | IN_MOVED_TO | IN_ONLYDIR, 'packages')
+        if self._add(processed_dir, IN_CREATE | IN_MOVED_TO | IN_ONLYDIR, 'processed') or processed_dir in self._paths:
+            try:
+                subdirs = [e.name for e in os.scandir(processed_dir) if e.is_dir()]
+            except OSError:
+                subdirs = []
+            for subdir in subdirs:
+                self._add(os.path.join(processed_dir, subdir), IN_CLOSE_WRITE | IN_MOVED_TO, 'subdir', subdir)
+
+    def _watch_new_subdir(self, subdir, changes):
+        path = os.path.join(navi_root(), 'processed', subdir)
+        self._add(path, IN_CLOSE_WRITE | IN_MOVED_TO, 'subdir', subdir)
+        # Files may have landed before the watch existed
+        try:
+            changes.files.update((subdir, e.name) for e in os.scandir(path) if e.is_file())
+        except OSError:
+            pass
+
+    def _watch_new_package(self, name, changes):
+        path = os.path.join(navi_root(), 'packages', name)
+        self._add(path, IN_CLOSE_WRITE | IN_MOVED_TO, 'package', name)
+        # The manifest may have been written before the watch existed
+        if os.path.exists(os.path.join(path, 'manifest.json')):
+            self._package_ready(path, name, changes)
+
+    def _package_ready(self, path, name, changes):
+        changes.packages.add(name)
+        self._remove(path)
+
+    def _read(self, changes):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = struct.unpack_from('iIII', data, offset)
+                raw = data[offset + 16:offset + 16 + length].split(b'\0', 1)[0]
+                offset += 16 + length
+                if mask & IN_Q_OVERFLOW:
+                    changes.overflow = True
+                    continue
+                watch = self._watches.get(wd)
+                if watch is None:
+                    continue
+                kind, path, subdir = watch
+                if mask & IN_IGNORED:
+                    del self._watches[wd]
+                    self._paths.pop(path, None)
+                    continue
+                name = os.fsdecode(raw)
+                if kind == 'subdir' and not mask & IN_ISDIR:
+                    changes.files.add((subdir, name))
+                elif kind == 'processed' and mask & IN_ISDIR:
+                    self._watch_new_subdir(name, changes)
+                elif kind == 'packages' and mask & IN_ISDIR:
+                    if mask & IN_MOVED_TO:
+                        changes.packages.add(name)
+                    else:
+                        self._watch_new_package(name, changes)
+                elif kind == 'package' and name == 'manifest.json':
+                    self._package_ready(path, subdir, changes)
+                elif kind == 'config' and name == os.path.basename(config_path()):
+                    changes.config = True
+
+    def collect(self, timeout, settle=INTAKE_SETTLE):
+        """
+        Block up to `timeout` seconds for changes, then keep reading until
+        nothing new arrives for `settle` seconds (so a file and its sidecar
+        are routed together).
+        """
+        changes = IntakeChanges()
+        ready, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        while ready:
+            self._read(changes)
+            ready, _, _ = select.select([self._fd], [], [], settle)
+        return changes
+
+
+def intake_fingerprint():
+    """
+    mtimes of NAVI/processed, NAVI/packages and each directory directly
+    under them, as a set, plus the newest of those mtimes. A polling daemon
+    compares it between polls to skip idle sweeps: one stat per directory
+    instead of one per file. Adding, removing or renaming an entry moves its
+    directory's mtime; a file rewritten in place does not, which the
+    periodic sweep covers.
+    """
+    marks = set()
+    for top in ('processed', 'packages'):
+        path = os.path.join(navi_root(), top)
+        try:
+            marks.add((top, '', os.stat(path).st_mtime_ns))
+            with os.scandir(path) as it:
+                marks.update((top, e.name, e.stat().st_mtime_ns) for e in it if e.is_dir())
+        except OSError:
+            marks.add((top, '', None))
+    newest = max((m[2] for m in marks if m[2] is not None), default=0)
+    return frozenset(marks), newest
+
+
+def write_metrics():
+    """Write METRICS to NAVI/logs; a failure is reported but never fatal."""
+    try:
+        METRICS.write()
+    except OSError as e:
+        print(f"Metrics write failed: {e}", file=sys.stderr)
+
+
+def _daemon_cycle(ledger, route_cache, rules, store, files=None, packages=None, shards=None, emit=None,
+                  pool=None):
+    sweep = files is None
+    pkg_stats = {}
+    delivered = process_packages(rules, stats=pkg_stats, names=packages, store=store, ledger=ledger)
+    stats = {}
+    routed, routing_details = process_files(ledger=ledger, stats=stats, config=rules, candidates=files,
+                                            store=store, route_cache=route_cache, shards=shards, emit=emit,
+                                            pool=pool)
+    ledger.flush()
+    route_cache.flush()
+    if store is not None:
+        store.flush()
+        stats['dedupe'] = store.take_stats()
+    stats['incomplete_packages'] = pkg_stats.get('incomplete', [])
+    if emit is not None:
+        if stats.get('routed_counts') or pkg_stats.get('new'):
+            emit([build_stream_summary(delivered, stats)])
+            # Streamed cycles keep no file lists to patch the snapshot with
+            regenerate_present_page(None, delivered)
+            write_metrics()
+    elif routed or pkg_stats.get('new'):
+        print(json.dumps(build_summary(routed, delivered, routing_details, stats)), flush=True)
+        # Event cycles patch the in-memory present snapshot; sweeps rebuild it
+        regenerate_present_page(routing_details, delivered, full=sweep)
+        write_metrics()
+
+
+def run_daemon(interval=DAEMON_INTERVAL, stop=None, reconcile=RECONCILE_INTERVAL, watch=True, shards=None,
+               emit=None):
+    """
+    Stay resident and route new arrivals as they land.
+
+    The ledger, compiled rules, route cache and shard pool are kept in
+    memory between cycles; the config is reloaded only when
+    routing_config.json changes. A summary line
+    is printed (and the present page regenerated) only for cycles that
+    delivered something. Stops on SIGINT/SIGTERM or when `stop` is set.
+
+    With inotify available (and `watch` true) only changed paths are
+    routed, plus a full reconciliation sweep every `reconcile` seconds to
+    catch missed events. Otherwise intake_fingerprint() is polled every
+    `interval` seconds and the tree is swept only when it changed, or once
+    every `reconcile` seconds regardless.
+
+    A cycle that raises is logged and retried by a sweep after `interval`
+    seconds; the shard pool is rebuilt, since a crashed worker leaves it
+    broken for good.
+    """
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+    ledger = DeliveryLedger.load()
+    route_cache = RouteCache.load()
+    watcher = ConfigWatcher()
+    intake = IntakeWatcher.create() if watch else None
+    blob_store = None
+
+    def store_for(rules):
+        nonlocal blob_store
+        if not dedupe_enabled(rules):
+            return None
+        if blob_store is None:
+            blob_store = BlobStore.load()
+        return blob_store
+
+    shard_pool = None
+
+    def cycle(files=None, packages=None):
+        """One routing cycle; False when it failed and the tree needs another sweep."""
+        # One ShardPool lives as long as the config, mode and store it was built for
+        nonlocal shard_pool
+        try:
+            rules = watcher.current()
+            store = store_for(rules)
+            n = shard_count(rules) if shards is None else max(1, shards)
+            if shard_pool is not None and not shard_pool.matches(n, rules, delivery_mode(rules), route_cache, store):
+                shard_pool.close()
+                shard_pool = None
+            if shard_pool is None and n > 1:
+                shard_pool = ShardPool(n, rules, delivery_mode(rules), route_cache, store)
+            _daemon_cycle(ledger, route_cache, rules, store, files=files, packages=packages, shards=shards,
+                          emit=emit, pool=shard_pool)
+        except Exception as e:
+            METRICS.inc('mailroom_daemon_cycle_errors_total')
+            print(f"Daemon cycle failed: {e!r}", file=sys.stderr)
+            if shard_pool is not None:
+                try:
+                    shard_pool.close()
+                except Exception:
+                    pass
+                shard_pool = None
+            return False
+        return True
+
+    def metrics():
+        try:
+            write_metrics()
+        except Exception as e:
+            print(f"Writing metrics failed: {e!r}", file=sys.stderr)
+
+    next_sweep = 0.0
+    last_seen = None
+    try:
+        while not stop.is_set():
+            if intake is None:
+                now = time.monotonic()
+                # Taken before the sweep, so arrivals during it are seen next poll
+                seen, newest = intake_fingerprint()
+                if seen != last_seen or now >= next_sweep:
+                    ok = cycle()
+                    next_sweep = now + reconcile
+                    last_seen = None if not ok or time.time_ns() - newest < POLL_RACY_NS else seen
+                stop.wait(interval)
+                continue
+
+            now = time.monotonic()
+            if now >= next_sweep:
+                intake.sync()
+                ok = cycle()
+                metrics()
+                next_sweep = now + (reconcile if ok else interval)
+                continue
+
+            # Wake at least once a second so `stop` is honoured
+            changes = intake.collect(min(1.0, next_sweep - now))
+            if changes.overflow:
+                next_sweep = 0.0
+                continue
+            if changes.files or changes.packages:
+                if not cycle(files=changes.files, packages=changes.packages):
+                    next_sweep = min(next_sweep, time.monotonic() + interval)
+            elif changes.config:
+                watcher.current()
+    finally:
+        if intake is not None:
+            intake.close()
+        if shard_pool is not None:
+            shard_pool.close()
+        ledger.flush()
+        write_metrics()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='NAVI Mailroom Runner')
+    parser.add_argument('--force', action='store_true',
+                        help='re-deliver files already recorded in the delivery ledger')
+    parser.add_argument('--daemon', action='store_true',
+                        help='stay resident and route new arrivals as they land')
+    parser.add_argument('--interval', type=float, default=DAEMON_INTERVAL,
+                        help=f'daemon poll interval without inotify, in seconds (default {DAEMON_INTERVAL})')
+    parser.add_argument('--reconcile', type=float, default=RECONCILE_INTERVAL,
+                        help=f'seconds between full sweeps, even when nothing seems to have changed '
+                             f'(default {RECONCILE_INTERVAL:g})')
+    parser.add_argument('--no-watch', action='store_true',
+                        help='poll every --interval instead of using inotify')
+    parser.add_argument('--shards', type=int, metavar='N',
+                        help='route and deliver on N worker processes (default: mailroom.shards, 1)')
+    parser.add_argument('--format', choices=('json', 'ndjson'), default='json',
+                        help='json: one summary document at the end (default); ndjson: one record per '
+                             'routed file as it is delivered, then a summary record')
+    parser.add_argument('--profile', nargs='?', const='', metavar='PATH',
+                        help=f'write cProfile stats (pstats format) to PATH, default NAVI/logs/{PROFILE_FILENAME}')
+    args = parser.parse_args(argv)
+    if args.daemon and args.force:
+        parser.error('--force cannot be combined with --daemon')
+    return args
+
+
+def main(argv=None):
+    """Main entry point."""
+    args = parse_args(argv)
+    if args.profile is None:
+        return run(args)
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run, args)
+    finally:
+        path = args.profile or os.path.join(navi_root(), 'logs', PROFILE_FILENAME)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}", file=sys.stderr)
+
+
+def run(args):
+    """One mailroom run (or the daemon) for parsed command-line args."""
+    emit = ndjson_writer() if args.format == 'ndjson' else None
+    if args.daemon:
+        run_daemon(args.interval, reconcile=args.reconcile, watch=not args.no_watch, shards=args.shards,
+                   emit=emit)
+        return
+
+    config = load_config()
+    store = BlobStore.load() if dedupe_enabled(config) else None
+    # One ledger for both stages: loaded (and its journal replayed) once
+    ledger = DeliveryLedger.load()
+
+    # Process packages first
+    pkg_stats = {}
+    packages = process_packages(config, stats=pkg_stats, store=store, ledger=ledger)
+    
+    # Process individual files
+    stats = {'incomplete_packages': pkg_stats.get('incomplete', [])}
+    routed, routing_details = process_files(ledger=ledger, force=args.force, stats=stats, config=config,
+                                            store=store, shards=args.shards, emit=emit)
+    ledger.flush()
+    if store is not None:
+        store.flush()
+        stats['dedupe'] = store.take_stats()
     
-    print(json.dumps(output, indent=2))
+    # Output summary
+    if emit is not None:
+        emit([build_stream_summary(packages, stats)])
+    else:
+        print(json.dumps(build_summary(routed, packages, routing_details, stats), indent=2))
 
     # Regenerate present page for humans
-    try:
-        import subprocess, sys
-        py = sys.executable or 'python'
-        gen = os.path.join(ROOT, 'scripts', 'generate_present_page.py')
-        if os.path.exists(gen):
-            # run generator from repo root and capture output
-            res = subprocess.run([py, gen], cwd=ROOT, capture_output=True, text=True)
-            log_path = os.path.join(NAVI_ROOT, 'logs', 'present_gen.log')
-            try:
-                os.makedirs(os.path.dirname(log_path), exist_ok=True)
-                with open(log_path, 'a', encoding='utf-8') as lf:
-                    lf.write(f"[{datetime.now(timezone.utc).isoformat()}] generator returncode={res.returncode}\n")
-                    lf.write(res.stdout or '')
-                    lf.write(res.stderr or '')
-            except Exception:
-                pass
-            if res.returncode != 0:
-                # surface failure to stderr so CI can detect failures
-                print(f"Present page generator failed with returncode={res.returncode}", file=__import__('sys').stderr)
-    except Exception:
-        pass
+    regenerate_present_page(routing_details, packages)
+    write_metrics()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,38 @@
+import importlib.util
+import json
+from pathlib import Path
+
+
+def load_bench():
+    cur = Path(__file__).resolve()
+    for parent in cur.parents:
+        candidate = parent / 'scripts' / 'bench_mailroom.py'
+        if candidate.exists():
+            spec = importlib.util.spec_from_file_location('bench_mailroom', candidate)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return module
+    raise FileNotFoundError('scripts/bench_mailroom.py')
+
+
+def test_bench_writes_machine_readable_results(tmp_path):
+    bench = load_bench()
+    out = tmp_path / 'bench.json'
+    bench.main(['--files', '50', '--subdirs', '3', '--packages', '2', '--package-files', '3',
+                '--out', str(out)])
+
+    results = json.loads(out.read_text())
+    run = results['runs'][0]
+    assert run['files'] == 50
+    assert run['routed'] == 50
+    assert set(run['stages']) == {'process_packages', 'process_files', 'process_files_warm', 'present_page',
+                                  'present_page_incremental'}
+    cold = run['stages']['process_files']
+    assert cold['items'] == 50 and cold['fs_calls_total'] > 0
+    # The warm re-run is served from the delivery ledger
+    assert run['stages']['process_files_warm']['fs_calls_total'] < cold['fs_calls_total']
+    # The incremental page refresh only re-lists what the late batch touched
+    incremental = run['stages']['present_page_incremental']
+    assert incremental['items'] == 10
+    assert incremental['fs_calls_total'] < run['stages']['present_page']['fs_calls_total']
+    assert all({'rss_delta_kb', 'peak_rss_delta_kb'} <= set(stage) for stage in run['stages'].values())
@@ -0,0 +1,309 @@
+import io
+import os
+import json
+import socket
+import subprocess
+import sys
+import sqlite3
+import threading
+import time
+import importlib
+
+import pytest
+
+# extract_text.py pip-installs pdfminer.six when it is missing; never from tests
+pytest.importorskip('pdfminer')
+
+TOOL = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'current', 'tools', 'extract_text.py'))
+
+
+def load_tool():
+    # A fresh, importable module: pool workers import it by name
+    if os.path.dirname(TOOL) not in sys.path:
+        sys.path.insert(0, os.path.dirname(TOOL))
+    sys.modules.pop('extract_text', None)
+    return importlib.import_module('extract_text')
+
+
+def test_serve_answers_json_lines_on_a_stream(tmp_path):
+    et = load_tool()
+    note = tmp_path / 'note.txt'
+    note.write_text('  invoice total 42  ')
+    requests = io.StringIO('\n'.join([
+        json.dumps({'id': 1, 'path': str(note)}),
+        '',
+        json.dumps({'id': 2, 'paths': [str(note), str(tmp_path / 'gone.pdf')]}),
+        'not json',
+    ]) + '\n')
+    replies = io.StringIO()
+    et.serve_stream(requests, replies)
+
+    first, second, bad = [json.loads(line) for line in replies.getvalue().splitlines()]
+    assert first == {'id': 1, 'text': {str(note): 'invoice total 42'}}
+    assert second == {'id': 2, 'text': {str(note): 'invoice total 42', str(tmp_path / 'gone.pdf'): ''}}
+    assert 'error' in bad
+
+
+def test_serve_rejects_malformed_paths_and_keeps_serving(tmp_path):
+    et = load_tool()
+    note = tmp_path / 'note.txt'
+    note.write_text('memo')
+    bad = [{'path': 5}, {'path': None}, {'paths': [None]}, {'paths': 'abc'}, [1], 7]
+    requests = io.StringIO(''.join(json.dumps(r) + '\n' for r in bad + [{'path': str(note)}]))
+    replies = io.StringIO()
+    et.serve_stream(requests, replies)
+
+    *errors, last = [json.loads(line) for line in replies.getvalue().splitlines()]
+    assert len(errors) == len(bad) and all('error' in e for e in errors)
+    assert last == {'text': {str(note): 'memo'}}
+
+
+def test_serve_on_unix_socket(tmp_path):
+    et = load_tool()
+    note = tmp_path / 'memo.md'
+    note.write_text('# Memo')
+    path = str(tmp_path / 'extract.sock')
+    threading.Thread(target=et.serve_socket, args=(path,), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.01)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        stream = sock.makefile('rwb')
+        for i in range(2):
+            stream.write((json.dumps({'id': i, 'path': str(note)}) + '\n').encode('utf8'))
+            stream.flush()
+            assert json.loads(stream.readline()) == {'id': i, 'text': {str(note): '# Memo'}}
+
+
+def test_pool_streams_results_and_times_out_stuck_files(tmp_path):
+    et = load_tool()
+    os.mkfifo(tmp_path / 'stuck.txt')  # reading it blocks: no writer ever opens it
+    paths = [str(tmp_path / 'stuck.txt')]
+    for name in ('a.txt', 'b.txt', 'c.md'):
+        (tmp_path / name).write_text('body ' + name)
+        paths.append(str(tmp_path / name))
+
+    pool = et.ExtractPool(2, timeout=3.0)
+    try:
+        started = time.monotonic()
+        results = list(pool.imap(paths))
+        assert time.monotonic() - started < 10
+        assert results[-1][0] == paths[0] and results[-1][1]['method'] == 'timeout'
+        assert {p: record['text'] for p, record in results} == {
+            paths[0]: '', paths[1]: 'body a.txt', paths[2]: 'body b.txt', paths[3]: 'body c.md'}
+        # The killed worker was replaced
+        again = {p: record['text'] for p, record in pool.imap(paths[1:])}
+        assert again == {p: 'body ' + os.path.basename(p) for p in paths[1:]}
+    finally:
+        pool.close()
+
+
+def test_jobs_output_stays_keyed_by_absolute_path(tmp_path, monkeypatch, capsys):
+    et = load_tool()
+    for i in range(5):
+        (tmp_path / f'n{i}.txt').write_text(f'note {i}')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('NAVI_ROOT', str(tmp_path / 'NAVI'))
+    et.main(['--jobs', '3'] + [f'n{i}.txt' for i in range(5)] + ['missing.pdf'])
+    out = json.loads(capsys.readouterr().out)
+    assert list(out) == [str(tmp_path / f'n{i}.txt') for i in range(5)] + [str(tmp_path / 'missing.pdf')]
+    assert out[str(tmp_path / 'n4.txt')] == 'note 4'
+    assert out[str(tmp_path / 'missing.pdf')] == ''
+
+
+def test_cache_serves_unchanged_files_and_recognises_copies(tmp_path, monkeypatch):
+    et = load_tool()
+    calls = []
+    real = et._extract
+    monkeypatch.setattr(et, '_extract', lambda p: calls.append(p) or real(p))
+    doc = tmp_path / 'invoice.txt'
+    doc.write_text('Invoice 7 total 42')
+    cache = et.ExtractCache(str(tmp_path / 'cache.sqlite'))
+    assert dict(et.extract_many([str(doc)], cache=cache))[str(doc)]['method'] == 'text'
+    cache.close()
+
+    cache = et.ExtractCache(str(tmp_path / 'cache.sqlite'))
+    record = dict(et.extract_many([str(doc)], cache=cache))[str(doc)]
+    assert record['text'] == 'Invoice 7 total 42' and record['cached']
+    # Same bytes under a new identity: found by content hash
+    copy = tmp_path / 'copy.txt'
+    copy.write_bytes(doc.read_bytes())
+    assert dict(et.extract_many([str(copy)], cache=cache))[str(copy)]['cached']
+    # Changed content is extracted again
+    doc.write_text('Invoice 7 total 43 (amended)')
+    assert dict(et.extract_many([str(doc)], cache=cache))[str(doc)]['text'] == 'Invoice 7 total 43 (amended)'
+    cache.close()
+    assert calls == [str(doc), str(doc)]
+
+
+def test_cache_holds_no_lock_between_writes_and_survives_a_locked_database(tmp_path, monkeypatch, capsys):
+    et = load_tool()
+    monkeypatch.setattr(et, 'CACHE_BUSY_TIMEOUT', 0.1)
+    db = str(tmp_path / 'cache.sqlite')
+    (tmp_path / 'a.txt').write_text('alpha')
+    (tmp_path / 'b.txt').write_text('beta')
+    holder = et.ExtractCache(db)
+    list(et.extract_many([str(tmp_path / 'a.txt')], cache=holder))  # one write, left open
+    et.main(['--cache', db, str(tmp_path / 'b.txt')])
+    assert json.loads(capsys.readouterr().out) == {str(tmp_path / 'b.txt'): 'beta'}
+
+    # Another writer holding the lock only costs the cache, not the run
+    blocker = sqlite3.connect(db)
+    blocker.execute('BEGIN IMMEDIATE')
+    (tmp_path / 'c.txt').write_text('gamma')
+    et.main(['--cache', db, str(tmp_path / 'c.txt')])
+    captured = capsys.readouterr()
+    assert json.loads(captured.out) == {str(tmp_path / 'c.txt'): 'gamma'}
+    assert 'cache unavailable' in captured.err
+    blocker.rollback()
+    blocker.close()
+    holder.close()
+
+
+def test_resident_server_and_batch_run_share_one_cache(tmp_path, monkeypatch, capsys):
+    et = load_tool()
+    db = str(tmp_path / 'cache.sqlite')
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        (tmp_path / name).write_text('body ' + name)
+    pdfminer_home = os.path.dirname(os.path.dirname(pytest.importorskip('pdfminer').__file__))
+    env = dict(os.environ, PYTHONPATH=pdfminer_home, NAVI_ROOT=str(tmp_path / 'NAVI'))
+    server = subprocess.Popen([sys.executable, TOOL, '--serve', '--cache', db], env=env, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        server.stdin.write(json.dumps({'path': str(tmp_path / 'a.txt')}) + '\n')
+        server.stdin.flush()
+        assert json.loads(server.stdout.readline()) == {'text': {str(tmp_path / 'a.txt'): 'body a.txt'}}
+
+        # The server stays up after its write; a batch run can still write the cache
+        started = time.monotonic()
+        et.main(['--cache', db, str(tmp_path / 'b.txt')])
+        captured = capsys.readouterr()
+        assert json.loads(captured.out) == {str(tmp_path / 'b.txt'): 'body b.txt'}
+        assert 'cache unavailable' not in captured.err and time.monotonic() - started < et.CACHE_BUSY_TIMEOUT
+
+        server.stdin.write(json.dumps({'paths': [str(tmp_path / 'b.txt'), str(tmp_path / 'c.txt')]}) + '\n')
+        server.stdin.flush()
+        assert json.loads(server.stdout.readline())['text'][str(tmp_path / 'c.txt')] == 'body c.txt'
+    finally:
+        server.stdin.close()
+        assert server.wait(10) == 0
+    cache = et.ExtractCache(db, variant=json.dumps(et.pdf_options, sort_keys=True))
+    assert all(cache.get(str(tmp_path / name))['cached'] for name in ('a.txt', 'b.txt', 'c.txt'))
+    cache.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    et = load_tool()
+    cache = et.ExtractCache(str(tmp_path / 'cache.sqlite'), max_bytes=2500)
+    paths = []
+    for i in range(3):
+        p = tmp_path / f'd{i}.txt'
+        p.write_text(str(i) * (1000 + i))  # distinct sizes: no hashing between them
+        paths.append(str(p))
+    list(et.extract_many(paths[:2], cache=cache))
+    assert dict(et.extract_many(paths[:1], cache=cache))[paths[0]]['cached']
+    time.sleep(0.01)
+    list(et.extract_many(paths[2:], cache=cache))  # over budget: d1 is the oldest unused
+    assert cache.get(paths[0])['cached']
+    assert cache.get(paths[1]) is None
+    cache.close()
+
+
+def test_ndjson_writes_one_record_per_file(tmp_path, monkeypatch, capsys):
+    et = load_tool()
+    (tmp_path / 'a.txt').write_text('alpha')
+    (tmp_path / 'b.md').write_text('beta')
+    monkeypatch.setenv('NAVI_ROOT', str(tmp_path / 'NAVI'))
+    et.main(['--ndjson', str(tmp_path / 'a.txt'), str(tmp_path / 'b.md'), str(tmp_path / 'gone.pdf')])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(r['path'], r['text'], r['method']) for r in records] == [
+        (str(tmp_path / 'a.txt'), 'alpha', 'text'),
+        (str(tmp_path / 'b.md'), 'beta', 'text'),
+        (str(tmp_path / 'gone.pdf'), '', 'missing'),
+    ]
+    assert all(set(r) == {'path', 'text', 'method', 'ms'} and r['ms'] >= 0 for r in records)
+
+
+def test_unwritable_cache_location_falls_back_to_no_cache(tmp_path, monkeypatch, capsys):
+    et = load_tool()
+    (tmp_path / 'a.txt').write_text('alpha')
+    (tmp_path / 'plain').write_text('')
+    monkeypatch.setenv('NAVI_ROOT', str(tmp_path / 'plain' / 'NAVI'))  # under a regular file
+    et.main([str(tmp_path / 'a.txt')])
+    captured = capsys.readouterr()
+    assert json.loads(captured.out) == {str(tmp_path / 'a.txt'): 'alpha'}
+    assert 'cache disabled' in captured.err
+
+
+def make_pdf(path, page_texts):
+    """Minimal PDF with one line of Helvetica text per page."""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+    body = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += f'{i} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(body)
+    body += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    body += b''.join(f'{off:010d} 00000 n \n'.encode('latin-1') for off in offsets)
+    body += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    path.write_bytes(body)
+
+
+def test_page_selection():
+    et = load_tool()
+    assert et.select_pages(10, 'first:2,last:2') == [0, 1, 8, 9]
+    assert et.select_pages(10, 'last:1,first:3') == [9, 0, 1, 2]
+    assert et.select_pages(9, 'sample:3') == [0, 4, 8]
+    assert et.select_pages(2, 'first:3,last:1,sample:4') == [0, 1]
+    with pytest.raises(ValueError):
+        et.parse_pages('middle:2')
+
+
+def test_pdf_pages_are_read_until_the_budget_is_met(tmp_path):
+    et = load_tool()
+    pdf = tmp_path / 'contract.pdf'
+    make_pdf(pdf, [f'Clause page {i}' for i in range(1, 8)])
+
+    text = et.extract_from_pdf(str(pdf))
+    assert [line for line in text.split() if line.isdigit()] == ['1', '2', '3', '7']
+    assert 'page 2' in text and text.index('page 3') < text.index('page 7')
+    assert et.extract_from_pdf(str(pdf), pages='last:1').strip() == 'Clause page 7'
+    # Budget met by the first page: nothing else is laid out
+    assert et.extract_from_pdf(str(pdf), maxchars=5) == 'Claus'
+    assert 'page 4' in et.extract_from_pdf(str(pdf), pages='sample:3')
+
+
+def test_text_cut_short_by_the_time_budget_is_not_cached(tmp_path, monkeypatch):
+    et = load_tool()
+    pdf = tmp_path / 'contract.pdf'
+    make_pdf(pdf, [f'Clause page {i}' for i in range(1, 8)])
+    note = tmp_path / 'note.txt'
+    note.write_text('x' * 100)
+    monkeypatch.setitem(et.pdf_options, 'maxchars', 40)
+    cache = et.ExtractCache(str(tmp_path / 'cache.sqlite'))
+
+    monkeypatch.setitem(et.pdf_options, 'time_budget', 1e-9)
+    record = et.extract_record(str(pdf))
+    assert record['partial'] and 'page 1' in record['text'] and 'page 7' not in record['text']
+    cache.put(str(pdf), record)
+    assert cache.get(str(pdf)) is None
+
+    monkeypatch.setitem(et.pdf_options, 'time_budget', 0)
+    record = et.extract_record(str(pdf))
+    assert 'partial' not in record
+    cache.put(str(pdf), record)
+    assert cache.get(str(pdf))['cached']
+    # --max-chars applies to plain text as well
+    assert et.extract_record(str(note))['text'] == 'x' * 40
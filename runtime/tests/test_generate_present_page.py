@@ -112,3 +112,61 @@ def test_mailroom_triggers_present_generation_integration(tmp_path):
     html = out_html.read_text()
     assert 'CTO_BATCH-9999_20251225' in html
     assert 'sample_in_pkg.txt' in html
+
+
+def load_generator():
+    import importlib.util
+    src = find_repo_file(Path(__file__), Path('scripts') / 'generate_present_page.py')
+    spec = importlib.util.spec_from_file_location('generate_present_page', src)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_apply_routing_matches_full_rescan(tmp_path):
+    gen = load_generator()
+    nav = tmp_path / 'NAVI'
+    inbox = nav / 'offices' / 'CFO' / 'inbox'
+    inbox.mkdir(parents=True)
+    (inbox / 'old.pdf').write_text('old')
+    _, snapshot = gen.generate(str(nav))
+
+    # Deliveries made by a mailroom run after the snapshot was taken
+    (inbox / 'new.pdf').write_text('new')
+    (inbox / 'new.pdf.navi.json').write_text('{}')
+    clo = nav / 'offices' / 'CLO' / 'inbox' / 'CLO_BATCH-0002_20251225'
+    clo.mkdir(parents=True)
+    (clo / 'contract.pdf').write_text('c')
+
+    out_path, patched = gen.generate(str(nav), snapshot, {'CFO': ['new.pdf']}, ['CLO_BATCH-0002_20251225'])
+    assert patched == gen.build_snapshot(str(nav))
+    assert 'contract.pdf' in Path(out_path).read_text()
+    assert json.loads((nav / 'present' / 'present.json').read_text()) == patched
+
+
+def test_incremental_refresh_rerenders_only_changed_offices(tmp_path, monkeypatch):
+    gen = load_generator()
+    monkeypatch.setattr(gen, 'RACY_NS', 0)
+    nav = tmp_path / 'NAVI'
+    for office in ('CFO', 'CLO', 'CTO'):
+        inbox = nav / 'offices' / office / 'inbox'
+        inbox.mkdir(parents=True)
+        (inbox / f'{office.lower()}.pdf').write_text(office)
+
+    stats = {}
+    gen.generate(str(nav), stats=stats)
+    assert stats['rerendered'] == ['CFO', 'CLO', 'CTO']
+    gen.generate(str(nav), stats=stats)
+    assert stats['rerendered'] == []
+
+    # Bump the mtime explicitly so the test does not depend on clock granularity
+    inbox = nav / 'offices' / 'CLO' / 'inbox'
+    (inbox / 'nda.pdf').write_text('nda')
+    st = os.stat(inbox)
+    os.utime(inbox, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    gen._fragments.clear()  # read the cache back from disk, as a fresh run would
+    out_path, snapshot = gen.generate(str(nav), stats=stats)
+    assert stats['rerendered'] == ['CLO']
+    assert snapshot == gen.build_snapshot(str(nav))
+    assert Path(out_path).read_text().split('<div class="grid">')[1] == \
+        gen.render_html(snapshot).split('<div class="grid">')[1]
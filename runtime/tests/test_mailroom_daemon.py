@@ -0,0 +1,209 @@
+import os
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import mailroom_runner as mr
+
+
+def wait_for(path, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if path.exists():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_config_watcher_reloads_only_on_change(tmp_path):
+    config_dir = tmp_path / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    cfg = config_dir / 'routing_config.json'
+    cfg.write_text(json.dumps({'filename_overrides': {'Navi_': 'CTO'}}))
+
+    mr.ROOT = str(tmp_path)
+    watcher = mr.ConfigWatcher()
+    first = watcher.current()
+    assert watcher.current() is first
+
+    # Touch without changing content: re-hashed but not recompiled
+    os.utime(cfg, ns=(time.time_ns(), time.time_ns() + 10_000_000))
+    assert watcher.current() is first
+
+    cfg.write_text(json.dumps({'filename_overrides': {'Navi_': 'AIR'}}))
+    assert watcher.current().override_for('Navi_x') == 'AIR'
+
+    # A half-written file keeps the previous rules
+    cfg.write_text('{"filename_overrides": ')
+    assert watcher.current().override_for('Navi_x') == 'AIR'
+    assert watcher.reloads == 2
+
+
+@pytest.mark.parametrize('watch', [True, False])
+def test_daemon_routes_new_arrivals(tmp_path, watch):
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    mr.ROOT = str(tmp_path)
+
+    stop = threading.Event()
+    daemon = threading.Thread(target=mr.run_daemon, kwargs={'interval': 0.02, 'stop': stop, 'watch': watch})
+    daemon.start()
+    try:
+        staged = tmp_path / 'late_arrival.txt'
+        staged.write_text('hello')
+        os.replace(staged, processed / 'late_arrival.txt')
+        assert wait_for(tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'late_arrival.txt')
+    finally:
+        stop.set()
+        daemon.join(5)
+    assert not daemon.is_alive()
+    ledger = mr.DeliveryLedger.load()
+    assert ledger.is_delivered('2025-12-25/late_arrival.txt', 5, (processed / 'late_arrival.txt').stat().st_mtime_ns)
+
+
+def test_polling_daemon_skips_sweeps_while_nothing_changes(tmp_path, monkeypatch):
+    processed = tmp_path / 'NAVI' / 'processed'
+    (processed / '2025-12-24').mkdir(parents=True)
+    (processed / '2025-12-24' / 'old.txt').write_text('history')
+    (tmp_path / 'NAVI' / 'packages').mkdir()
+    past = time.time_ns() - 60 * 10**9
+    for d in (processed / '2025-12-24', processed, tmp_path / 'NAVI' / 'packages'):
+        os.utime(d, ns=(past, past))
+    mr.ROOT = str(tmp_path)
+    cycles = []
+    real_cycle = mr._daemon_cycle
+    monkeypatch.setattr(mr, '_daemon_cycle', lambda *a, **k: cycles.append(k.get('files')) or real_cycle(*a, **k))
+
+    stop = threading.Event()
+    daemon = threading.Thread(target=mr.run_daemon, kwargs={'interval': 0.02, 'stop': stop, 'watch': False})
+    daemon.start()
+    try:
+        assert wait_for(tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'old.txt')
+        time.sleep(0.3)
+        assert len(cycles) == 1  # the startup sweep only
+        staged = tmp_path / 'new.txt'
+        staged.write_text('fresh')
+        os.replace(staged, processed / '2025-12-24' / 'new.txt')
+        assert wait_for(tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'new.txt')
+    finally:
+        stop.set()
+        daemon.join(5)
+    assert not daemon.is_alive()
+
+
+def test_daemon_keeps_one_shard_pool_across_cycles(tmp_path, monkeypatch):
+    processed = tmp_path / 'NAVI' / 'processed'
+    processed.mkdir(parents=True)
+    mr.ROOT = str(tmp_path)
+    starts = []
+    real_start = mr.ShardPool._start
+    monkeypatch.setattr(mr.ShardPool, '_start', lambda self: starts.append(self) or real_start(self))
+
+    stop = threading.Event()
+    daemon = threading.Thread(target=mr.run_daemon,
+                              kwargs={'interval': 0.02, 'stop': stop, 'watch': False, 'shards': 2})
+    daemon.start()
+    try:
+        for day in ('2025-12-24', '2025-12-25'):
+            staged = tmp_path / day
+            staged.mkdir()
+            for i in range(mr.SHARD_MIN_BATCH + 8):
+                (staged / f'{day}_{i:02d}.txt').write_text(day)
+            os.rename(staged, processed / day)  # one cycle sees the whole batch
+            assert wait_for(tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / f'{day}_{mr.SHARD_MIN_BATCH + 7}.txt')
+    finally:
+        stop.set()
+        daemon.join(10)
+    assert not daemon.is_alive()
+    assert len(starts) == 1
+    assert starts[0]._executor is None  # closed with the daemon
+
+
+def test_daemon_survives_a_failed_cycle_and_rebuilds_its_pool(tmp_path, monkeypatch, capsys):
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'retry.txt').write_text('again')
+    mr.ROOT = str(tmp_path)
+    pools = []
+    real_cycle = mr._daemon_cycle
+
+    def flaky_cycle(*a, **k):
+        pools.append(k['pool'])
+        if len(pools) == 1:
+            raise BrokenProcessPool('a worker died')
+        return real_cycle(*a, **k)
+
+    monkeypatch.setattr(mr, '_daemon_cycle', flaky_cycle)
+    stop = threading.Event()
+    daemon = threading.Thread(target=mr.run_daemon,
+                              kwargs={'interval': 0.02, 'stop': stop, 'watch': False, 'shards': 2})
+    daemon.start()
+    try:
+        assert wait_for(tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'retry.txt')
+    finally:
+        stop.set()
+        daemon.join(10)
+    assert not daemon.is_alive()
+    assert pools[1] is not pools[0]
+    assert 'Daemon cycle failed' in capsys.readouterr().err
+
+
+def test_intake_watcher_reports_only_changed_paths(tmp_path):
+    processed = tmp_path / 'NAVI' / 'processed'
+    (processed / '2025-12-24').mkdir(parents=True)
+    (processed / '2025-12-24' / 'old.txt').write_text('history')
+    (tmp_path / 'NAVI' / 'packages').mkdir()
+    mr.ROOT = str(tmp_path)
+
+    intake = mr.IntakeWatcher.create()
+    if intake is None:
+        pytest.skip('inotify not available')
+    try:
+        assert not intake.collect(0.05)
+
+        (processed / '2025-12-24' / 'new.txt').write_text('fresh')
+        (processed / '2025-12-24' / 'new.txt.navi.json').write_text('{}')
+        (processed / '2025-12-25').mkdir()
+        (processed / '2025-12-25' / 'today.txt').write_text('today')
+        pkg = tmp_path / 'NAVI' / 'packages' / 'CFO_BATCH-0001_20251225'
+        pkg.mkdir()
+        (pkg / 'a.pdf').write_text('still packing')
+        changes = intake.collect(1.0)
+        # today.txt arrives via the new-subdir scan or its own event
+        deadline = time.time() + 2
+        while ('2025-12-25', 'today.txt') not in changes.files and time.time() < deadline:
+            more = intake.collect(0.2)
+            changes.files |= more.files
+        assert ('2025-12-24', 'new.txt') in changes.files
+        assert ('2025-12-24', 'new.txt.navi.json') in changes.files
+        assert ('2025-12-25', 'today.txt') in changes.files
+        assert ('2025-12-24', 'old.txt') not in changes.files
+        # A package created in place is not ready until its manifest lands
+        assert not changes.packages
+        (pkg / 'manifest.json').write_text(json.dumps({'files': [{'filename': 'a.pdf'}]}))
+        staged = tmp_path / 'CTO_BATCH-0002_20251225'
+        staged.mkdir()
+        os.rename(staged, tmp_path / 'NAVI' / 'packages' / staged.name)
+        more = intake.collect(1.0)
+        assert more.packages == {'CFO_BATCH-0001_20251225', 'CTO_BATCH-0002_20251225'}
+        (pkg / 'late.txt').write_text('after delivery')
+        assert not intake.collect(0.1).packages
+    finally:
+        intake.close()
+
+    routed, _ = mr.process_files(candidates=changes.files)
+    assert sorted(routed) == ['new.txt', 'today.txt']
+
+
+if __name__ == '__main__':
+    test_config_watcher_reloads_only_on_change(Path(tempfile.mkdtemp()))
+    test_daemon_routes_new_arrivals(Path(tempfile.mkdtemp()), True)
+    test_intake_watcher_reports_only_changed_paths(Path(tempfile.mkdtemp()))
+    print('ok')
@@ -0,0 +1,392 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import mailroom_runner as mr
+
+
+def make_tree(root, workers):
+    config_dir = root / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    cfg = {
+        'mailroom': {'delivery_workers': workers},
+        'function_to_office': {'Finance': 'CFO', 'Legal': 'CLO'}
+    }
+    (config_dir / 'routing_config.json').write_text(json.dumps(cfg))
+    routes = ['Finance', 'Legal', None]
+    for day in ('2025-12-24', '2025-12-25'):
+        processed = root / 'NAVI' / 'processed' / day
+        processed.mkdir(parents=True)
+        for i in range(30):
+            name = f'doc_{day}_{i:02d}.txt'
+            (processed / name).write_text(name)
+            route = routes[i % 3]
+            if route:
+                (processed / (name + '.navi.json')).write_text(json.dumps({'function': route}))
+
+
+def test_parallel_delivery_matches_sequential_output(tmp_path):
+    mr.ROOT = str(tmp_path / 'seq')
+    make_tree(tmp_path / 'seq', 1)
+    seq_routed, seq_details = mr.process_files()
+
+    mr.ROOT = str(tmp_path / 'par')
+    make_tree(tmp_path / 'par', 3)
+    par_routed, par_details = mr.process_files()
+
+    assert len(par_routed) == 60
+    assert par_routed == seq_routed
+    assert par_details == seq_details
+    assert sorted(par_details) == ['CFO', 'CLO', 'EXEC']
+    for office, files in par_details.items():
+        inbox = tmp_path / 'par' / 'NAVI' / 'offices' / office / 'inbox'
+        assert all((inbox / f).exists() for f in files)
+
+
+def test_sharded_run_matches_single_process_run(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(mr, 'SHARD_MIN_BATCH', 1)
+    monkeypatch.setattr(mr, '_notices', set())
+    runs = {}
+    for label, shards in (('single', 1), ('sharded', 3)):
+        root = tmp_path / label
+        make_tree(root, 2)
+        cfg = json.loads((root / 'NAVI' / 'config' / 'routing_config.json').read_text())
+        cfg['mailroom']['dedupe_store'] = True
+        cfg['keywords_to_function'] = {'Legal': ['contract']}
+        (root / 'NAVI' / 'config' / 'routing_config.json').write_text(json.dumps(cfg))
+        # Same name in two subdirs, bound for the same inbox: scan order decides the winner
+        (root / 'NAVI' / 'processed' / '2025-12-24' / 'contract.txt').write_text('older contract')
+        (root / 'NAVI' / 'processed' / '2025-12-25' / 'contract.txt').write_text('newer contract')
+
+        mr.ROOT = str(root)
+        stats = {}
+        routed, details = mr.process_files(stats=stats, shards=shards)
+        inbox = root / 'NAVI' / 'offices' / 'CLO' / 'inbox' / 'contract.txt'
+        ledger = sorted(mr.DeliveryLedger.load()._entries)
+        runs[label] = (routed, details, stats['dedupe']['blobs_stored'], inbox.read_text(), ledger)
+        assert mr.process_files(shards=shards) == ([], {})
+
+    assert runs['sharded'] == runs['single']
+    assert len(runs['sharded'][0]) == 62
+    # Two sharded runs, one note that urgency scheduling was bypassed
+    assert capsys.readouterr().err.count('urgency scheduling is bypassed') == 1
+
+
+def test_urgent_files_are_delivered_before_routine_ones(tmp_path):
+    make_tree(tmp_path, 1)
+    cfg_path = tmp_path / 'NAVI' / 'config' / 'routing_config.json'
+    cfg = json.loads(cfg_path.read_text())
+    cfg['urgency_keywords'] = {'urgent': ['urgent'], 'high': ['deadline'], 'past_due': ['final notice']}
+    cfg_path.write_text(json.dumps(cfg))
+    # Oldest subdir, so a scan-order run would deliver these last
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-24'
+    (processed / 'filing.txt').write_text('The filing deadline is Friday')
+    (processed / 'FINAL_NOTICE_power.txt').write_text('account 1234')
+    (processed / 'outage.pdf').write_bytes(b'%PDF')
+    (processed / 'outage.pdf.navi.json').write_text(json.dumps({'function': 'Legal', 'urgency': 'URGENT'}))
+
+    mr.ROOT = str(tmp_path)
+    mr.METRICS.reset()
+    routed, details = mr.process_files()
+    assert routed[:3] == ['outage.pdf', 'FINAL_NOTICE_power.txt', 'filing.txt']
+    assert len(routed) == 63
+    assert 'outage.pdf' in details['CLO']
+    assert mr.METRICS.histogram('mailroom_time_to_inbox_seconds', urgency='urgent')[0] == 1
+    assert mr.METRICS.histogram('mailroom_time_to_inbox_seconds', urgency='routine')[0] == 60
+
+    # A window smaller than the backlog only lets urgent mail overtake what it can see
+    queue = mr.UrgencyQueue(iter([{'urgency': None, 'n': 0}, {'urgency': None, 'n': 1},
+                                  {'urgency': 'high', 'n': 2}, {'urgency': 'urgent', 'n': 3}]), window=2)
+    assert [job['n'] for job in queue.next_batch(1)] == [0]
+    assert [job['n'] for job in queue.next_batch(3)] == [2, 1]
+    assert [job['n'] for job in queue.next_batch(3)] == [3]
+    assert queue.next_batch(3) == []
+
+
+def write_mode_config(root, mode):
+    config_dir = root / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    (config_dir / 'routing_config.json').write_text(json.dumps({'mailroom': {'delivery_mode': mode}}))
+
+
+def test_hardlink_mode_shares_inode_with_processed(tmp_path):
+    write_mode_config(tmp_path, 'hardlink')
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'scan.pdf').write_bytes(b'%PDF-1.4 scan')
+    pkg = tmp_path / 'NAVI' / 'packages' / 'CFO_BATCH-0001_20251225'
+    pkg.mkdir(parents=True)
+    (pkg / 'bill.pdf').write_bytes(b'%PDF-1.4 bill')
+
+    mr.ROOT = str(tmp_path)
+    assert mr.process_packages() == ['CFO_BATCH-0001_20251225']
+    routed, _ = mr.process_files()
+    assert routed == ['scan.pdf']
+
+    inbox = tmp_path / 'NAVI' / 'offices'
+    assert os.path.samefile(processed / 'scan.pdf', inbox / 'EXEC' / 'inbox' / 'scan.pdf')
+    assert os.path.samefile(pkg / 'bill.pdf', inbox / 'CFO' / 'inbox' / 'CFO_BATCH-0001_20251225' / 'bill.pdf')
+
+
+def test_rename_and_reflink_modes_deliver_content(tmp_path):
+    processed = tmp_path / 'src'
+    processed.mkdir()
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    (processed / 'a.txt').write_text('alpha')
+    (processed / 'b.txt').write_text('beta')
+
+    mr.place_file(str(processed / 'a.txt'), str(inbox / 'a.txt'), 'rename')
+    assert not (processed / 'a.txt').exists()
+    assert (inbox / 'a.txt').read_text() == 'alpha'
+
+    # reflink falls back to a copy on filesystems without FICLONE
+    mr.place_file(str(processed / 'b.txt'), str(inbox / 'b.txt'), 'reflink')
+    assert (inbox / 'b.txt').read_text() == 'beta'
+    assert (processed / 'b.txt').exists()
+
+
+def test_dedupe_store_links_duplicate_attachments(tmp_path):
+    config_dir = tmp_path / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    (config_dir / 'routing_config.json').write_text(json.dumps({'mailroom': {'dedupe_store': True}}))
+    body = b'%PDF-1.4 same attachment' * 100
+    for day, route in (('2025-12-24', 'CFO'), ('2025-12-25', 'CLO')):
+        processed = tmp_path / 'NAVI' / 'processed' / day
+        processed.mkdir(parents=True)
+        (processed / 'attachment.pdf').write_bytes(body)
+        (processed / 'attachment.pdf.navi.json').write_text(json.dumps({'route': route}))
+        (processed / f'unique_{day}.txt').write_text(day)
+
+    mr.ROOT = str(tmp_path)
+    stats = {}
+    routed, details = mr.process_files(stats=stats)
+    assert sorted(details) == ['CFO', 'CLO', 'EXEC']
+    assert stats['dedupe'] == {'hits': 1, 'bytes_saved': len(body), 'blobs_stored': 3}
+
+    offices = tmp_path / 'NAVI' / 'offices'
+    cfo = offices / 'CFO' / 'inbox' / 'attachment.pdf'
+    clo = offices / 'CLO' / 'inbox' / 'attachment.pdf'
+    assert cfo.read_bytes() == body
+    assert os.path.samefile(cfo, clo)
+    assert (offices / 'CLO' / 'inbox' / 'attachment.pdf.navi.json').exists()
+    index = (tmp_path / 'NAVI' / 'metadata' / mr.BLOB_INDEX_FILENAME).read_text().splitlines()
+    assert len(index) == 3
+
+    # A fresh store picks the digests up from the index
+    store = mr.BlobStore.load()
+    extra = tmp_path / 'copy.pdf'
+    extra.write_bytes(body)
+    assert store.deliver(str(extra), str(tmp_path / 'out.pdf')) is True
+
+    # A blob deleted from disk is stored again rather than trusted from the index
+    blob = store.blob_path(hashlib.sha256(body).hexdigest())
+    os.remove(blob)
+    assert store.deliver(str(extra), str(tmp_path / 'again.pdf')) is False
+    assert os.path.samefile(blob, tmp_path / 'again.pdf')
+
+
+def test_dedupe_store_never_hardlinks_a_blob_to_its_source(tmp_path):
+    config_dir = tmp_path / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    (config_dir / 'routing_config.json').write_text(
+        json.dumps({'mailroom': {'dedupe_store': True, 'delivery_mode': 'hardlink'}}))
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    body = b'%PDF-1.4 invoice' * 64
+    (processed / 'invoice.pdf').write_bytes(body)
+
+    mr.ROOT = str(tmp_path)
+    mr.process_files()
+    inbox = tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'invoice.pdf'
+    assert not os.path.samefile(inbox, processed / 'invoice.pdf')
+    with open(processed / 'invoice.pdf', 'r+b') as f:  # rewritten in place, same inode
+        f.write(b'X' * len(body))
+    assert inbox.read_bytes() == body
+
+    # A blob that no longer matches its source's size is stored again on the next hit
+    store = mr.BlobStore.load()
+    blob = store.blob_path(hashlib.sha256(body).hexdigest())
+    with open(blob, 'r+b') as f:
+        f.truncate(10)
+    extra = tmp_path / 'copy.pdf'
+    extra.write_bytes(body)
+    assert store.deliver(str(extra), str(tmp_path / 'out.pdf'), 'hardlink') is False
+    assert (tmp_path / 'out.pdf').read_bytes() == body
+    assert not os.path.samefile(blob, extra)
+
+
+def test_dedupe_store_copies_bodies_outside_its_lock(tmp_path, monkeypatch):
+    mr.ROOT = str(tmp_path)
+    store = mr.BlobStore.load()
+    real = mr.place_file
+    both_copying = threading.Barrier(2, timeout=5)
+
+    def place(src, dst, mode='copy'):
+        both_copying.wait()  # breaks if the second copy waits for the first
+        real(src, dst, mode)
+
+    monkeypatch.setattr(mr, 'place_file', place)
+    sources = []
+    for i in range(2):
+        (tmp_path / f'big{i}.pdf').write_bytes(b'%PDF' + bytes([i]) * 4096)
+        sources.append(str(tmp_path / f'big{i}.pdf'))
+    with ThreadPoolExecutor(2) as pool:
+        hits = list(pool.map(lambda src: store.deliver(src, src + '.out'), sources))
+    assert hits == [False, False]
+    assert store.take_stats()['blobs_stored'] == 2
+    assert not [p for p in (tmp_path / 'NAVI' / 'blobs').rglob('*.part')]
+
+
+def test_entity_is_written_into_a_fresh_delivered_sidecar(tmp_path):
+    config_dir = tmp_path / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    (config_dir / 'routing_config.json').write_text(json.dumps({
+        'mailroom': {'delivery_mode': 'hardlink'},
+        'entity_signals': {'LHI': {'names': ['Loric Homes'], 'addresses': []},
+                           'DDM': {'names': ['Eric Dille'], 'addresses': []}},
+    }))
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'quote.pdf').write_bytes(b'%PDF')
+    sidecar = {'route': 'CSO', 'extracted_text_snippet': 'Quote for LORIC  HOMES kitchen'}
+    (processed / 'quote.pdf.navi.json').write_text(json.dumps(sidecar))
+    (processed / 'note.txt').write_text('From Eric Dille')
+    (processed / 'plain.txt').write_text('nothing to see')
+
+    mr.ROOT = str(tmp_path)
+    mr.process_files()
+    inbox = tmp_path / 'NAVI' / 'offices'
+    delivered = inbox / 'CSO' / 'inbox' / 'quote.pdf.navi.json'
+    assert json.loads(delivered.read_text()) == dict(sidecar, entity='LHI')
+    assert not os.path.samefile(delivered, processed / 'quote.pdf.navi.json')
+    assert json.loads((processed / 'quote.pdf.navi.json').read_text()) == sidecar
+    assert json.loads((inbox / 'EXEC' / 'inbox' / 'note.txt.navi.json').read_text()) == \
+        {'filename': 'note.txt', 'entity': 'DDM'}
+    assert not (inbox / 'EXEC' / 'inbox' / 'plain.txt.navi.json').exists()
+
+
+def make_package(root, name, bodies, checksums=True):
+    pkg = root / 'NAVI' / 'packages' / name
+    pkg.mkdir(parents=True)
+    entries = []
+    for fname, body in bodies.items():
+        (pkg / fname).write_bytes(body)
+        entry = {'filename': fname, 'sidecar': fname + '.navi.json', 'metadata': None}
+        if checksums:
+            entry['sha256'] = hashlib.sha256(body).hexdigest()
+        entries.append(entry)
+    (pkg / 'manifest.json').write_text(json.dumps({'package': name, 'files': entries}))
+    return pkg
+
+
+def test_interrupted_package_copy_resumes_from_staging(tmp_path, monkeypatch):
+    name = 'CFO_BATCH-0002_20251225'
+    bodies = {f'part{i}.pdf': f'page {i}'.encode() * 50 for i in range(4)}
+    make_package(tmp_path, name, bodies)
+    mr.ROOT = str(tmp_path)
+    office = tmp_path / 'NAVI' / 'offices' / 'CFO'
+
+    real = mr._deliver_package_file
+    copied = []
+
+    def crash_after_two(src, dst, mode, store, expected):
+        if len(copied) == 2:
+            raise OSError('disk went away')
+        copied.append(os.path.basename(src))
+        return real(src, dst, mode, store, expected)
+
+    monkeypatch.setattr(mr, '_deliver_package_file', crash_after_two)
+    assert mr.process_packages() == []
+    assert not (office / 'inbox' / name).exists()
+    progress = (office / mr.STAGING_DIRNAME / (name + mr.PROGRESS_SUFFIX)).read_text().splitlines()
+    assert len(progress) == 2
+
+    copied.clear()
+    monkeypatch.setattr(mr, '_deliver_package_file', lambda *a: copied.append(a[0]) or real(*a))
+    stats = {}
+    assert mr.process_packages(stats=stats) == [name]
+    assert stats['new'] == 1
+    # manifest.json, part0 and part1 were staged before the crash
+    assert len(copied) == 3
+    for fname, body in bodies.items():
+        assert (office / 'inbox' / name / fname).read_bytes() == body
+    assert os.listdir(office / mr.STAGING_DIRNAME) == []
+    ledger = mr.DeliveryLedger.load()
+    assert len(ledger) == 1
+
+
+def test_package_not_matching_manifest_is_held(tmp_path):
+    mr.ROOT = str(tmp_path)
+    bad = make_package(tmp_path, 'CLO_BATCH-0003_20251225', {'nda.pdf': b'signed'})
+    (bad / 'nda.pdf').write_bytes(b'tampered')
+    short = make_package(tmp_path, 'CTO_BATCH-0004_20251225', {'spec.md': b'spec'}, checksums=False)
+    (short / 'spec.md').unlink()
+
+    stats = {}
+    assert mr.process_packages(stats=stats) == []
+    assert sorted(stats['incomplete']) == ['CLO_BATCH-0003_20251225', 'CTO_BATCH-0004_20251225']
+    offices = tmp_path / 'NAVI' / 'offices'
+    assert not (offices / 'CLO' / 'inbox' / 'CLO_BATCH-0003_20251225').exists()
+    assert not (offices / 'CTO' / 'inbox' / 'CTO_BATCH-0004_20251225').exists()
+
+    # Once the packager finishes, the package goes through
+    (short / 'spec.md').write_bytes(b'spec')
+    assert mr.process_packages() == ['CTO_BATCH-0004_20251225']
+
+
+def test_manifest_naming_files_outside_the_package_is_held(tmp_path):
+    mr.ROOT = str(tmp_path)
+    (tmp_path / 'NAVI' / 'secret.txt').parent.mkdir(parents=True)
+    (tmp_path / 'NAVI' / 'secret.txt').write_text('not for the inbox')
+    for n, filename in enumerate(('../../secret.txt', str(tmp_path / 'NAVI' / 'secret.txt'))):
+        pkg = make_package(tmp_path, f'CFO_BATCH-001{n}_20251225', {'bill.pdf': b'%PDF'})
+        (pkg / 'manifest.json').write_text(json.dumps({'files': [{'filename': 'bill.pdf'}, {'filename': filename}]}))
+
+    stats = {}
+    assert mr.process_packages(stats=stats) == []
+    assert len(stats['incomplete']) == 2
+    assert not list((tmp_path / 'NAVI' / 'offices' / 'CFO' / 'inbox').iterdir())
+
+
+def test_inbox_package_from_before_the_ledger_is_recorded_not_repaired(tmp_path):
+    name = 'COO_BATCH-0005_20251225'
+    bodies = {'roster.csv': b'a,b\n' * 100, 'notes.txt': b'shift notes'}
+    pkg = make_package(tmp_path, name, bodies)
+    # Delivered before packages were ledgered; a reviewer has since filed notes.txt away
+    dest = tmp_path / 'NAVI' / 'offices' / 'COO' / 'inbox' / name
+    dest.mkdir(parents=True)
+    (dest / 'roster.csv').write_bytes(bodies['roster.csv'])
+
+    mr.ROOT = str(tmp_path)
+    stats = {}
+    assert mr.process_packages(stats=stats) == [name]
+    assert stats == {'new': 0, 'repaired': 0, 'incomplete': []}
+    assert not (dest / 'notes.txt').exists()
+    assert 'packages/' + name in mr.DeliveryLedger.load()
+
+    # A package re-issued after delivery is verified against its source and repaired
+    (dest / 'roster.csv').write_bytes(b'a,b\n' * 10)
+    os.utime(pkg / 'manifest.json', ns=(time.time_ns(), time.time_ns() + 10**9))
+    mr.process_packages(stats=stats)
+    assert stats['repaired'] == 1
+    for fname, body in bodies.items():
+        assert (dest / fname).read_bytes() == body
+
+
+if __name__ == '__main__':
+    test_parallel_delivery_matches_sequential_output(Path(tempfile.mkdtemp()))
+    test_hardlink_mode_shares_inode_with_processed(Path(tempfile.mkdtemp()))
+    test_rename_and_reflink_modes_deliver_content(Path(tempfile.mkdtemp()))
+    test_dedupe_store_links_duplicate_attachments(Path(tempfile.mkdtemp()))
+    test_package_not_matching_manifest_is_held(Path(tempfile.mkdtemp()))
+    test_manifest_naming_files_outside_the_package_is_held(Path(tempfile.mkdtemp()))
+    test_inbox_package_from_before_the_ledger_is_recorded_not_repaired(Path(tempfile.mkdtemp()))
+    print('ok')
@@ -0,0 +1,192 @@
+import os
+import json
+import tempfile
+from pathlib import Path
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import mailroom_runner as mr
+
+
+def test_second_run_skips_delivered_files(tmp_path):
+    root = tmp_path
+    processed = root / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'invoice.txt').write_text('amount due')
+    (processed / 'invoice.txt.navi.json').write_text(json.dumps({'route': 'CFO'}))
+
+    mr.ROOT = str(root)
+    routed, details = mr.process_files()
+    assert routed == ['invoice.txt']
+    assert (root / 'NAVI' / 'metadata' / mr.LEDGER_FILENAME).exists()
+
+    # Reviewer moved the file out of the inbox; it must not come back
+    (root / 'NAVI' / 'offices' / 'CFO' / 'inbox' / 'invoice.txt').unlink()
+    stats = {}
+    routed, details = mr.process_files(stats=stats)
+    assert routed == []
+    assert stats['skipped'] == 1
+    assert not (root / 'NAVI' / 'offices' / 'CFO' / 'inbox' / 'invoice.txt').exists()
+
+
+def test_changed_or_forced_files_are_redelivered(tmp_path):
+    root = tmp_path
+    processed = root / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    src = processed / 'memo.txt'
+    src.write_text('v1')
+
+    mr.ROOT = str(root)
+    mr.process_files()
+
+    src.write_text('version two')
+    routed, _ = mr.process_files()
+    assert routed == ['memo.txt']
+    assert (root / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'memo.txt').read_text() == 'version two'
+
+    routed, _ = mr.process_files(force=True)
+    assert routed == ['memo.txt']
+
+
+def test_planning_pairs_sidecars_without_extra_probes(tmp_path, monkeypatch):
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    for i in range(20):
+        (processed / f'f{i}.txt').write_text('x')
+        if i % 2:
+            (processed / f'f{i}.txt.navi.json').write_text(json.dumps({'route': 'CFO'}))
+    (processed / 'nested').mkdir()
+
+    mr.ROOT = str(tmp_path)
+    calls = []
+    for name in ('stat', 'lstat'):
+        real = getattr(os, name)
+        monkeypatch.setattr(os, name, lambda *a, _real=real, **k: calls.append(a) or _real(*a, **k))
+
+    ledger = mr.DeliveryLedger(str(tmp_path / 'ledger.jsonl'))
+    jobs = list(mr.plan_deliveries(str(tmp_path / 'NAVI' / 'processed'), ledger, mr.compile_rules({})))
+    monkeypatch.undo()
+
+    assert calls == []
+    assert len(jobs) == 20
+    offices = {job['fname']: job['office'] for job in jobs}
+    assert offices['f1.txt'] == 'CFO' and offices['f2.txt'] == 'EXEC'
+    assert all((job['sidecar'] is None) == (int(job['fname'][1:-4]) % 2 == 0) for job in jobs)
+
+
+def test_interrupted_run_is_settled_from_the_journal(tmp_path):
+    navi = tmp_path / 'NAVI'
+    processed = navi / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        (processed / name).write_text(f'body of {name}')
+    (processed / 'a.txt.navi.json').write_text(json.dumps({'route': 'CFO'}))
+    mr.ROOT = str(tmp_path)
+
+    def entry(op, name, office):
+        st = os.stat(processed / name)
+        sidecar = processed / (name + '.navi.json')
+        return {'op': op, 'key': '2025-12-25/' + name, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                'office': office, 'sidecar': mr._sidecar_signature(sidecar.stat()) if sidecar.exists() else None}
+
+    # Crash state: a.txt placed but not committed, b.txt torn mid-copy,
+    # c.txt committed but the ledger never flushed
+    cfo = navi / 'offices' / 'CFO' / 'inbox'
+    execu = navi / 'offices' / 'EXEC' / 'inbox'
+    cfo.mkdir(parents=True)
+    execu.mkdir(parents=True)
+    mr.shutil.copy2(processed / 'a.txt', cfo / 'a.txt')
+    mr.shutil.copy2(processed / 'a.txt.navi.json', cfo / 'a.txt.navi.json')
+    (execu / ('b.txt' + mr.PART_SUFFIX)).write_text('bo')
+    mr.shutil.copy2(processed / 'c.txt', execu / 'c.txt')
+    journal = navi / 'metadata' / mr.JOURNAL_FILENAME
+    journal.parent.mkdir()
+    journal.write_text(''.join(json.dumps(e) + '\n' for e in (
+        entry('plan', 'a.txt', 'CFO'), entry('plan', 'b.txt', 'EXEC'),
+        entry('plan', 'c.txt', 'EXEC'), entry('commit', 'c.txt', 'EXEC'))) + '{"op": "comm')
+
+    ledger = mr.DeliveryLedger.load()
+    assert sorted(ledger._entries) == ['2025-12-25/a.txt', '2025-12-25/c.txt']
+    assert not journal.exists()
+    assert not (execu / ('b.txt' + mr.PART_SUFFIX)).exists()
+
+    routed, _ = mr.process_files(ledger=ledger)
+    assert routed == ['b.txt']
+    assert (execu / 'b.txt').read_text() == 'body of b.txt'
+    ledger.flush()
+    assert not journal.exists()
+    assert len(mr.DeliveryLedger.load()) == 3
+
+
+
+def test_replay_finishes_a_rename_cut_short_before_the_sidecar(tmp_path):
+    navi = tmp_path / 'NAVI'
+    (navi / 'config').mkdir(parents=True)
+    (navi / 'config' / 'routing_config.json').write_text(json.dumps({'mailroom': {'delivery_mode': 'rename'}}))
+    processed = navi / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    cfo = navi / 'offices' / 'CFO' / 'inbox'
+    cfo.mkdir(parents=True)
+    mr.ROOT = str(tmp_path)
+    entries = []
+    for name, office in (('inv.pdf', 'CFO'), ('sharded.pdf', None)):
+        (processed / name).write_bytes(b'%PDF ' + name.encode())
+        (processed / (name + '.navi.json')).write_text(json.dumps({'route': 'CFO'}))
+        st = (processed / name).stat()
+        entries.append({'op': 'plan', 'key': '2025-12-25/' + name, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                        'office': office, 'sidecar': mr._sidecar_signature((processed / (name + '.navi.json')).stat())})
+        # Crash: the file was renamed into the inbox, its sidecar was not
+        os.rename(processed / name, cfo / name)
+    journal = navi / 'metadata' / mr.JOURNAL_FILENAME
+    journal.parent.mkdir()
+    journal.write_text(''.join(json.dumps(e) + '\n' for e in entries))
+
+    ledger = mr.DeliveryLedger.load()
+    assert {key: e['office'] for key, e in ledger._entries.items()} == {
+        '2025-12-25/inv.pdf': 'CFO', '2025-12-25/sharded.pdf': 'CFO'}
+    assert sorted(p.name for p in cfo.iterdir()) == [
+        'inv.pdf', 'inv.pdf.navi.json', 'sharded.pdf', 'sharded.pdf.navi.json']
+    assert list(processed.iterdir()) == []
+    assert mr.process_files(ledger=ledger)[0] == []
+
+
+def test_late_sidecar_reroutes_a_delivered_file(tmp_path):
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'inv.pdf').write_bytes(b'%PDF-1.4 invoice')
+    mr.ROOT = str(tmp_path)
+    ledger = mr.DeliveryLedger.load()
+    assert mr.process_files(ledger=ledger)[1] == {'EXEC': ['inv.pdf']}
+
+    (processed / 'inv.pdf.navi.json').write_text(json.dumps({'route': 'CFO'}))
+    changed = {('2025-12-25', 'inv.pdf.navi.json')}
+    assert mr.process_files(ledger=ledger, candidates=changed)[1] == {'CFO': ['inv.pdf']}
+    assert (tmp_path / 'NAVI' / 'offices' / 'CFO' / 'inbox' / 'inv.pdf').exists()
+    assert not (tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'inv.pdf').exists()
+    assert mr.process_files(ledger=ledger, candidates=changed)[0] == []
+
+    # A newer file of the same name now in the old inbox is not removed
+    later = tmp_path / 'NAVI' / 'processed' / '2025-12-26'
+    later.mkdir()
+    (later / 'memo.txt').write_text('first memo')
+    (processed / 'memo.txt').write_text('the other memo')
+    mr.process_files(ledger=ledger)
+    exec_memo = tmp_path / 'NAVI' / 'offices' / 'EXEC' / 'inbox' / 'memo.txt'
+    assert exec_memo.read_text() == 'the other memo'
+    (later / 'memo.txt.navi.json').write_text(json.dumps({'route': 'CLO'}))
+    assert mr.process_files(ledger=ledger)[1] == {'CLO': ['memo.txt']}
+    assert exec_memo.read_text() == 'the other memo'
+    ledger.flush()
+
+    # Ledger lines written before sidecars were tracked still count as delivered
+    st = (processed / 'inv.pdf').stat()
+    legacy = mr.DeliveryLedger(str(tmp_path / 'legacy.jsonl'))
+    legacy._entries['2025-12-25/inv.pdf'] = {'key': '2025-12-25/inv.pdf', 'size': st.st_size,
+                                              'mtime_ns': st.st_mtime_ns, 'office': 'CFO'}
+    assert legacy.is_delivered('2025-12-25/inv.pdf', st.st_size, st.st_mtime_ns, [1, 2])
+
+
+if __name__ == '__main__':
+    test_second_run_skips_delivered_files(Path(tempfile.mkdtemp()))
+    test_changed_or_forced_files_are_redelivered(Path(tempfile.mkdtemp()))
+    print('ok')
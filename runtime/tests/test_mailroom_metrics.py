@@ -0,0 +1,54 @@
+import os
+import json
+import pstats
+import tempfile
+from pathlib import Path
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import mailroom_runner as mr
+
+
+def test_run_writes_prometheus_metrics_and_profile(tmp_path, capsys):
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'invoice.pdf').write_bytes(b'x' * 2048)
+    (processed / 'invoice.pdf.navi.json').write_text(json.dumps({'route': 'CFO'}))
+    (processed / 'memo.txt').write_text('memo')
+    pkg = tmp_path / 'NAVI' / 'packages' / 'CLO_BATCH-0001_20251225'
+    pkg.mkdir(parents=True)
+    (pkg / 'nda.pdf').write_text('nda')
+
+    mr.ROOT = str(tmp_path)
+    mr.METRICS.reset()
+    profile = tmp_path / 'run.pstats'
+    mr.main(['--profile', str(profile)])
+    capsys.readouterr()
+
+    text = (tmp_path / 'NAVI' / 'logs' / mr.METRICS_FILENAME).read_text()
+    assert '# TYPE mailroom_file_delivery_seconds histogram' in text
+    assert 'mailroom_file_delivery_seconds_count 2' in text
+    assert 'mailroom_file_delivery_bytes_bucket{le="16384"} 2' in text
+    assert 'mailroom_bytes_delivered_total{mode="copy"} 2052' in text
+    assert 'mailroom_files_delivered_total{office="CFO"} 1' in text
+    assert 'mailroom_packages_delivered_total{office="CLO"} 1' in text
+    for stage in ('plan', 'deliver', 'process_files', 'process_packages'):
+        assert f'mailroom_stage_seconds_count{{stage="{stage}"}} 1' in text
+    assert 'mailroom_delivery_errors_total' not in text
+
+    stats = pstats.Stats(str(profile))
+    assert any(func[2] == 'process_files' for func in stats.stats)
+
+
+def test_delivery_errors_are_counted(tmp_path, capsys):
+    mr.ROOT = str(tmp_path)
+    mr.METRICS.reset()
+    assert mr.deliver_to_office(str(tmp_path / 'gone.pdf'), None, 'CFO') is False
+    capsys.readouterr()
+    assert mr.METRICS.value('mailroom_delivery_errors_total', kind='file') == 1
+    assert mr.METRICS.histogram('mailroom_file_delivery_seconds') == (0, 0)
+
+
+if __name__ == '__main__':
+    test_delivery_errors_are_counted(Path(tempfile.mkdtemp()), None)
+    print('ok')
@@ -0,0 +1,191 @@
+import os
+import json
+import random
+import tempfile
+from pathlib import Path
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import mailroom_runner as mr
+
+
+def test_compiled_overrides_keep_config_order():
+    rules = mr.compile_rules({
+        'filename_overrides': {
+            'Navi_KB': 'AIR',
+            'Navi_': 'CTO',
+            'Inv': 'NOT_AN_OFFICE',
+            'Invoice_': 'CFO',
+        }
+    })
+    assert rules.override_for('Navi_KB_00_Master_Index.md') == 'AIR'
+    assert rules.override_for('Navi_Test_Doc.txt') == 'CTO'
+    assert rules.override_for('Invoice_2025.pdf') == 'CFO'
+    assert rules.override_for('Nav.txt') is None
+    assert rules.override_for('') is None
+    # Plain dict configs still work through the public helpers
+    assert mr.check_filename_override('Navi_x', {'filename_overrides': {'Navi_': 'CTO'}}) == 'CTO'
+
+
+def test_route_table_is_case_folded():
+    rules = mr.compile_rules({'function_to_office': {'Finance': 'CFO', 'Legal': 'CLO', 'Bad': 'NOPE'}})
+    assert rules.office_for_route('LHI.Finance') == 'CFO'
+    assert rules.office_for_route('finance') == 'CFO'
+    assert rules.office_for_route('LEGAL') == 'CLO'
+    assert rules.office_for_route('cto') == 'CTO'
+    assert rules.office_for_route('Bad') == mr.DEFAULT_OFFICE
+    assert rules.office_for_route(None) == mr.DEFAULT_OFFICE
+    assert rules.get('function_to_office')['Finance'] == 'CFO'
+
+
+def test_load_config_returns_compiled_rules(tmp_path):
+    config_dir = tmp_path / 'NAVI' / 'config'
+    config_dir.mkdir(parents=True)
+    overrides = {f'ACCT{i:05d}_': 'CFO' for i in range(5000)}
+    (config_dir / 'routing_config.json').write_text(json.dumps({'filename_overrides': overrides}))
+
+    mr.ROOT = str(tmp_path)
+    rules = mr.load_config()
+    assert isinstance(rules, mr.RoutingRules)
+    assert rules.override_for('ACCT04999_statement.pdf') == 'CFO'
+    assert rules.override_for('ACCT5_statement.pdf') is None
+
+
+def test_route_cache_skips_json_and_follows_config_changes(tmp_path, monkeypatch):
+    sidecar = tmp_path / 'doc.txt.navi.json'
+    sidecar.write_text(json.dumps({'function': 'Finance', 'confidence': 91}))
+    cache_path = str(tmp_path / 'route_cache.jsonl')
+    v1 = mr.compile_rules({'_version': '1', 'function_to_office': {'Finance': 'CFO'}})
+    v2 = mr.compile_rules({'_version': '2', 'function_to_office': {'Finance': 'COO'}})
+
+    cache = mr.RouteCache.load(cache_path)
+    assert cache.office_for(str(sidecar), v1) == 'CFO'
+    cache.flush()
+
+    # A reloaded cache answers without parsing the sidecar, even after a config change
+    cache = mr.RouteCache.load(cache_path)
+    monkeypatch.setattr(mr.json, 'loads', lambda *a, **k: (_ for _ in ()).throw(AssertionError('parsed')))
+    assert cache.office_for(str(sidecar), v1) == 'CFO'
+    assert cache.office_for(str(sidecar), v2) == 'COO'
+    assert cache.hits == 2 and cache.misses == 0
+    monkeypatch.undo()
+
+    # A changed sidecar is a different key
+    sidecar.write_text(json.dumps({'function': 'Legal'}))
+    assert cache.office_for(str(sidecar), mr.compile_rules({'function_to_office': {'Legal': 'CLO'}})) == 'CLO'
+    assert cache.misses == 1
+
+
+def test_keyword_automaton_matches_naive_whole_word_scan():
+    rng = random.Random(7)
+    words = ['due', 'past due', 'date', 'due date', 'tax', 'ax', 'w-2', 'nda', 'a']
+    automaton = mr.KeywordAutomaton((w, w) for w in words)
+    vocab = words + ['syntax', 'agenda', 'overdue', 'W-2s']
+    for _ in range(200):
+        text = ' '.join(rng.choice(vocab) for _ in range(rng.randrange(1, 12)))
+        text = text.upper() if rng.random() < 0.3 else text.replace(' ', rng.choice([' ', '\n\t', '   ']))
+        norm = mr.KeywordAutomaton.normalize(text)
+        expected = sorted((i, i + len(w), w) for w in words for i in range(len(norm))
+                          if norm.startswith(w, i)
+                          and (i == 0 or not norm[i - 1].isalnum())
+                          and (i + len(w) == len(norm) or not norm[i + len(w)].isalnum()))
+        assert sorted(automaton.finditer(text)) == expected, text
+
+
+def test_classifier_resolves_conflicts_by_priority_order(tmp_path):
+    rules = mr.compile_rules({
+        'keywords_to_function': {'Finance': ['invoice', 'amount due'], 'Legal': ['contract'], 'Ops': ['schedule']},
+        'doc_type_to_function': {'utility_bill': 'Finance', 'work_order': 'Ops'},
+        'priority_order': ['Legal', 'Finance', 'Ops'],
+        'function_to_office': {'Finance': 'CFO', 'Legal': 'CLO', 'Ops': 'COO'},
+    })
+    assert rules.classify('Invoice #12, AMOUNT\n DUE on receipt') == 'Finance'
+    assert rules.classify('invoice for the contract amendment') == 'Legal'
+    assert rules.classify('your utility bill', 'scan.pdf') == 'Finance'
+    assert rules.classify(None, 'work_order_77.pdf') == 'Ops'
+    assert rules.classify('invoices and contractors') is None
+
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    (processed / 'letter.txt').write_text('Please sign the attached contract.')
+    (processed / 'scan.pdf').write_bytes(b'%PDF contract')  # not text-like: no content sniffing
+    (processed / 'ocr.pdf').write_bytes(b'%PDF')
+    (processed / 'ocr.pdf.navi.json').write_text(json.dumps({'extracted_text_snippet': 'Amount due: $40'}))
+    mr.ROOT = str(tmp_path)
+    ledger = mr.DeliveryLedger(str(tmp_path / 'ledger.jsonl'))
+    jobs = mr.plan_deliveries(str(tmp_path / 'NAVI' / 'processed'), ledger, rules,
+                              route_cache=mr.RouteCache(str(tmp_path / 'cache.jsonl')))
+    assert {job['fname']: job['office'] for job in jobs} == {'letter.txt': 'CLO', 'scan.pdf': 'EXEC', 'ocr.pdf': 'CFO'}
+
+
+def test_route_cache_reclassifies_after_keyword_change(tmp_path):
+    sidecar = tmp_path / 'note.pdf.navi.json'
+    sidecar.write_text(json.dumps({'extracted_text_snippet': 'Quarterly budget review'}))
+    base = {'function_to_office': {'Finance': 'CFO', 'Exec': 'EXEC'}}
+    before = mr.compile_rules(dict(base, keywords_to_function={'Exec': ['review']}))
+    after = mr.compile_rules(dict(base, keywords_to_function={'Exec': ['review'], 'Finance': ['budget']},
+                                  priority_order=['Finance', 'Exec']))
+    cache = mr.RouteCache(str(tmp_path / 'cache.jsonl'))
+    assert cache.office_for(str(sidecar), before) == 'EXEC'
+    assert cache.office_for(str(sidecar), after) == 'CFO'
+
+
+ENTITY_SIGNALS = {
+    'HSC': {'names': ['Home Stagers Choice', 'Home Stagers Choice Ltd', 'HSC'], 'addresses': ['3870 Mallow Rd']},
+    'LHI': {'names': ['Loric Homes', 'LORIC', 'Loric Homes and Interiors'], 'addresses': ['3870 Mallow Rd']},
+    'LTD': {'names': ['Loric Trading', 'LTD', 'Loric Trading Desk'], 'addresses': []},
+    'DDM': {'names': ['Eric Dille', 'Lori E Dailing'], 'addresses': ['2473 Hatch Cir', '2473 Hatch Circle']},
+}
+
+
+def test_entity_tagger_prefers_longest_name_then_address():
+    rules = mr.compile_rules({'entity_signals': ENTITY_SIGNALS})
+    assert rules.tag_entity('Bill to: HOME STAGERS\n  CHOICE   LTD, attn Loric') == 'HSC'
+    assert rules.tag_entity('Loric Trading Desk weekly P&L, cc Loric Homes') == 'LTD'
+    assert rules.tag_entity('Ship to 2473 hatch circle') == 'DDM'
+    assert rules.tag_entity('Service address: 3870 Mallow Rd; account holder Lori E. Dailing') == 'HSC'
+    assert rules.tag_entity('Floricultural supplies') is None
+    assert mr.compile_rules({}).tag_entity('Loric Homes') is None
+    # A single name or address given as a string, not a list
+    rules = mr.compile_rules({'entity_signals': {'LHI': {'names': 'Loric Homes', 'addresses': '12 Elm St'}}})
+    assert rules.tag_entity('a memo from Loric Homes') == 'LHI'
+    assert rules.tag_entity('ship to 12 elm st') == 'LHI'
+    assert rules.tag_entity('Hello, world') is None
+
+
+def test_null_mailroom_section_falls_back_to_defaults():
+    config = mr.compile_rules({'mailroom': None})
+    assert mr.delivery_mode(config) == 'copy'
+    assert not mr.dedupe_enabled(config)
+    assert mr.shard_count(config) == 1
+    assert mr.delivery_workers(config) == mr.DEFAULT_DELIVERY_WORKERS
+    assert mr.priority_window(config) == mr.DEFAULT_PRIORITY_WINDOW
+
+
+URGENCY_KEYWORDS = {
+    'urgent': ['urgent', 'ASAP'],
+    'high': ['deadline', 'due soon'],
+    'past_due': ['past due', 'final notice'],
+}
+
+
+def test_urgency_takes_the_most_urgent_tier_from_text_filename_and_sidecar():
+    rules = mr.compile_rules({'urgency_keywords': URGENCY_KEYWORDS})
+    assert rules.urgency('Balance is PAST\n due; reply asap') == 'urgent'
+    assert rules.urgency('Filing deadline in May') == 'high'
+    assert rules.urgency(None, 'FINAL_NOTICE_power.pdf') == 'past_due'
+    assert rules.urgency('nothing pressing', 'memo.txt', {'priority': 'High'}) == 'high'
+    assert rules.urgency('due soon', None, {'urgency': 'past due'}) == 'past_due'
+    assert rules.urgency('Deadlines are fun', 'urgently.txt', {'priority': 'normal'}) is None
+    assert mr.compile_rules({}).urgency('urgent') is None
+
+
+if __name__ == '__main__':
+    test_compiled_overrides_keep_config_order()
+    test_route_table_is_case_folded()
+    test_load_config_returns_compiled_rules(Path(tempfile.mkdtemp()))
+    test_keyword_automaton_matches_naive_whole_word_scan()
+    test_classifier_resolves_conflicts_by_priority_order(Path(tempfile.mkdtemp()))
+    test_entity_tagger_prefers_longest_name_then_address()
+    test_urgency_takes_the_most_urgent_tier_from_text_filename_and_sidecar()
+    print('ok')
@@ -66,6 +66,38 @@ def test_filename_override_routing(tmp_path):
     assert (office_inbox / 'Navi_Test_Doc.txt').exists()
 
 
+def test_ndjson_format_streams_one_record_per_file(tmp_path, capsys, monkeypatch):
+    processed = tmp_path / 'NAVI' / 'processed' / '2025-12-25'
+    processed.mkdir(parents=True)
+    for i in range(mr.DELIVERY_BATCH_SIZE + 5):
+        (processed / f'doc{i:04d}.txt').write_text('x')
+    (processed / 'doc0000.txt.navi.json').write_text(json.dumps({'route': 'CFO'}))
+    (tmp_path / 'NAVI' / 'packages' / 'CLO_BATCH-0001_20251225').mkdir(parents=True)
+
+    mr.ROOT = str(tmp_path)
+    loads = []
+    real_load = mr.DeliveryLedger.load
+    monkeypatch.setattr(mr.DeliveryLedger, 'load', lambda path=None: loads.append(path) or real_load(path))
+    mr.main(['--format', 'ndjson'])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    files, summary = lines[:-1], lines[-1]
+    assert len(files) == mr.DELIVERY_BATCH_SIZE + 5
+    assert all(record['type'] == 'file' for record in files)
+    by_name = {record['file']: record for record in files}
+    assert by_name['doc0000.txt'] == {'type': 'file', 'file': 'doc0000.txt', 'key': '2025-12-25/doc0000.txt',
+                                      'office': 'CFO', 'size': 1}
+    assert summary['type'] == 'summary'
+    assert summary['routed_count'] == len(files)
+    assert summary['routing_counts'] == {'CFO': 1, 'EXEC': len(files) - 1}
+    assert summary['packages_delivered'] == ['CLO_BATCH-0001_20251225']
+    assert 'routed_files' not in summary
+    # Packages and files share one ledger, loaded once and flushed once
+    assert len(loads) == 1
+    ledger = real_load()
+    assert 'packages/CLO_BATCH-0001_20251225' in ledger and '2025-12-25/doc0000.txt' in ledger
+
+
 if __name__ == '__main__':
     test_package_delivery(Path(tempfile.mkdtemp()))
     test_filename_override_routing(Path(tempfile.mkdtemp()))
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""Synthetic-load benchmark for the NAVI mailroom.
+
+Builds throwaway NAVI trees (processed subdirs with a configurable sidecar /
+filename-override mix, plus packages with manifests), then times each stage
+of runtime/mailroom_runner.py and the present page generator against them:
+
+  process_packages, process_files (cold), process_files (warm re-run),
+  present_page (generate() from scratch), present_page_incremental
+  (generate() applying a small daemon-sized routing batch to the kept
+  snapshot)
+
+Per stage it reports wall time, files/sec, filesystem calls, /proc/self/io
+read/write syscalls (Linux) and memory: rss_delta_kb (RSS after minus
+before) and peak_rss_delta_kb (how far the stage's peak rose above the RSS
+it started with). On Linux the kernel's high-water mark is reset before
+each stage; elsewhere the peak comes from ru_maxrss and only shows growth
+past every earlier stage's peak. Results are written as JSON so runs can be
+compared with --compare.
+
+Usage:
+  python scripts/bench_mailroom.py --files 1000,10000 --out bench.json
+  python scripts/bench_mailroom.py --files 10000 --compare bench.json
+"""
+import argparse
+import builtins
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+
+ROUTES = ['Finance', 'Legal', 'Ops', 'Sales', 'Marketing', 'Tech', 'Exec', 'Knowledge']
+OFFICES = ['CFO', 'CLO', 'COO', 'CSO', 'CMO', 'CTO', 'AIR', 'EXEC', 'COS']
+
+# os-level calls counted per stage (the syscall proxy; DirEntry's cached
+# types and stats are C-level and intentionally not counted)
+COUNTED_OS_CALLS = (
+    'stat', 'lstat', 'listdir', 'scandir', 'open', 'link', 'replace', 'rename',
+    'mkdir', 'remove', 'unlink', 'utime', 'chmod', 'sendfile', 'fstat',
+)
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CallCounter:
+    """Count filesystem calls made through the os module and builtins.open."""
+
+    def __init__(self):
+        self.counts = {}
+        self._saved = []
+
+    def _wrap(self, owner, name):
+        real = getattr(owner, name, None)
+        if real is None:
+            return
+        counts = self.counts
+
+        def counted(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return real(*args, **kwargs)
+
+        self._saved.append((owner, name, real))
+        setattr(owner, name, counted)
+
+    def __enter__(self):
+        for name in COUNTED_OS_CALLS:
+            self._wrap(os, name)
+        self._wrap(builtins, 'open')
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, real in reversed(self._saved):
+            setattr(owner, name, real)
+        self._saved = []
+
+
+def read_proc_io():
+    try:
+        with open('/proc/self/io', 'r', encoding='ascii') as f:
+            return {k: int(v) for k, v in (line.split(':') for line in f)}
+    except OSError:
+        return None
+
+
+def read_rss_kb():
+    """(current RSS, high-water mark) in kB from /proc/self/status; None off Linux."""
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]), int(fields['VmHWM'].split()[0])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def reset_peak_rss():
+    """Restart the kernel's RSS high-water mark at the current RSS (Linux 4.0+)."""
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def max_rss_kb():
+    """Process-lifetime peak RSS from getrusage; never goes down."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def build_tree(navi, files, subdirs, sidecar_ratio, override_ratio, overrides, packages, package_files, seed):
+    """Write a synthetic NAVI tree and return the number of files written."""
+    rng = random.Random(seed)
+    config = {
+        '_version': 'bench',
+        'filename_overrides': {f'OVR{i:05d}_': OFFICES[i % len(OFFICES)] for i in range(overrides)},
+        'function_to_office': {
+            'Finance': 'CFO', 'Legal': 'CLO', 'Ops': 'COO', 'Sales': 'CSO',
+            'Marketing': 'CMO', 'Tech': 'CTO', 'Exec': 'EXEC', 'Knowledge': 'AIR',
+        },
+    }
+    os.makedirs(os.path.join(navi, 'config'))
+    with open(os.path.join(navi, 'config', 'routing_config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+    processed = os.path.join(navi, 'processed')
+    per_dir = max(1, files // subdirs)
+    written = 0
+    for d in range(subdirs):
+        subdir = os.path.join(processed, f'2025-12-{d:04d}')
+        os.makedirs(subdir)
+        count = per_dir if d < subdirs - 1 else files - written
+        for i in range(count):
+            if overrides and rng.random() < override_ratio:
+                name = f'OVR{rng.randrange(overrides):05d}_doc_{d}_{i}.txt'
+            else:
+                name = f'doc_{d}_{i}.txt'
+            path = os.path.join(subdir, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f'synthetic document {d}/{i}\n')
+            if rng.random() < sidecar_ratio:
+                with open(path + '.navi.json', 'w', encoding='utf-8') as f:
+                    json.dump({'route': f'LHI.{rng.choice(ROUTES)}', 'confidence': 90}, f)
+            written += 1
+
+    for p in range(packages):
+        office = OFFICES[p % len(OFFICES)]
+        name = f'{office}_BATCH-{p:04d}_20251225'
+        pkg = os.path.join(navi, 'packages', name)
+        os.makedirs(pkg)
+        entries = []
+        for i in range(package_files):
+            fname = f'pkg_file_{i}.txt'
+            with open(os.path.join(pkg, fname), 'w', encoding='utf-8') as f:
+                f.write(f'package {name} file {i}\n')
+            entries.append({'filename': fname, 'sidecar': fname + '.navi.json', 'metadata': None})
+        with open(os.path.join(pkg, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'package': name, 'office': office, 'files': entries}, f)
+    return written
+
+
+def run_stage(name, fn, items):
+    peak_reset = reset_peak_rss()
+    rss_before = read_rss_kb()
+    maxrss_before = max_rss_kb()
+    io_before = read_proc_io()
+    with CallCounter() as counter:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+    io_after = read_proc_io()
+    rss_after = read_rss_kb()
+    if peak_reset and rss_before and rss_after:
+        peak_delta = rss_after[1] - rss_before[0]
+    elif maxrss_before is not None:
+        peak_delta = max_rss_kb() - maxrss_before
+    else:
+        peak_delta = None
+    stage = {
+        'seconds': round(elapsed, 6),
+        'items': items,
+        'files_per_sec': round(items / elapsed, 1) if elapsed > 0 and items else None,
+        'fs_calls': dict(sorted(counter.counts.items())),
+        'fs_calls_total': sum(counter.counts.values()),
+        'rss_delta_kb': rss_after[0] - rss_before[0] if rss_before and rss_after else None,
+        'peak_rss_delta_kb': peak_delta,
+    }
+    if io_before and io_after:
+        stage['read_syscalls'] = io_after['syscr'] - io_before['syscr']
+        stage['write_syscalls'] = io_after['syscw'] - io_before['syscw']
+    print(f"  {name:<24} {elapsed:9.3f}s  {stage['files_per_sec'] or 0:>12} files/s  "
+          f"{stage['fs_calls_total']:>10} fs calls", file=sys.stderr)
+    return stage, result
+
+
+def bench_size(mr, gen, files, args):
+    workdir = tempfile.mkdtemp(prefix='navi_bench_')
+    navi = os.path.join(workdir, 'NAVI')
+    saved_env = os.environ.get('NAVI_ROOT')
+    try:
+        t0 = time.perf_counter()
+        written = build_tree(navi, files, args.subdirs, args.sidecar_ratio, args.override_ratio,
+                             args.overrides, args.packages, args.package_files, args.seed)
+        build_seconds = time.perf_counter() - t0
+        os.environ['NAVI_ROOT'] = navi
+        print(f"files={files} (tree built in {build_seconds:.1f}s at {workdir})", file=sys.stderr)
+
+        stages = {}
+        stages['process_packages'], _ = run_stage(
+            'process_packages', mr.process_packages, args.packages * args.package_files)
+        stages['process_files'], (routed, _) = run_stage('process_files', mr.process_files, written)
+        stages['process_files_warm'], _ = run_stage('process_files_warm', mr.process_files, written)
+
+        stages['present_page'], (_, snapshot) = run_stage('present_page', lambda: gen.generate(navi), written)
+
+        # A daemon event cycle: a few new arrivals routed, then folded into the kept snapshot
+        batch_dir = os.path.join(navi, 'processed', '2026-01-01')
+        os.makedirs(batch_dir)
+        for i in range(args.increment):
+            with open(os.path.join(batch_dir, f'late_{i}.txt'), 'w', encoding='utf-8') as f:
+                f.write(f'late arrival {i}\n')
+        _, details = mr.process_files(candidates={('2026-01-01', f'late_{i}.txt') for i in range(args.increment)})
+        stages['present_page_incremental'], _ = run_stage(
+            'present_page_incremental', lambda: gen.generate(navi, snapshot, details, []), args.increment)
+        return {
+            'files': files,
+            'routed': len(routed),
+            'tree_build_seconds': round(build_seconds, 3),
+            'stages': stages,
+        }
+    finally:
+        if saved_env is None:
+            os.environ.pop('NAVI_ROOT', None)
+        else:
+            os.environ['NAVI_ROOT'] = saved_env
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline_path):
+    """Print per-stage time ratios against a previous results file."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {run['files']: run for run in baseline.get('runs', [])}
+    for run in current['runs']:
+        old = previous.get(run['files'])
+        if not old:
+            continue
+        for stage, data in run['stages'].items():
+            before = old['stages'].get(stage, {}).get('seconds')
+            if before:
+                ratio = data['seconds'] / before
+                flag = '  REGRESSION' if ratio > 1.2 else ''
+                print(f"files={run['files']} {stage:<24} {before:9.3f}s -> {data['seconds']:9.3f}s "
+                      f"(x{ratio:.2f}){flag}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Synthetic-load benchmark for the NAVI mailroom')
+    parser.add_argument('--files', default='1000,10000',
+                        help='comma-separated processed file counts, e.g. 1000,100000,1000000')
+    parser.add_argument('--subdirs', type=int, default=10, help='processed subdirs per tree')
+    parser.add_argument('--sidecar-ratio', type=float, default=0.7, help='share of files with a .navi.json sidecar')
+    parser.add_argument('--override-ratio', type=float, default=0.1, help='share of filenames hitting an override')
+    parser.add_argument('--overrides', type=int, default=100, help='filename_overrides prefixes in the config')
+    parser.add_argument('--packages', type=int, default=10, help='packages in NAVI/packages')
+    parser.add_argument('--package-files', type=int, default=20, help='files per package')
+    parser.add_argument('--increment', type=int, default=10,
+                        help='late arrivals routed before the present_page_incremental stage')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic trees')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mr = load_module('mailroom_runner', os.path.join(REPO_ROOT, 'runtime', 'mailroom_runner.py'))
+    gen = load_module('generate_present_page', os.path.join(REPO_ROOT, 'scripts', 'generate_present_page.py'))
+
+    results = {
+        'meta': {
+            'started': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {k: v for k, v in vars(args).items() if k not in ('out', 'compare')},
+        },
+        'runs': [bench_size(mr, gen, int(n), args) for n in args.files.split(',') if n.strip()],
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        compare(results, args.compare)
+    return results
+
+
+if __name__ == '__main__':
+    main()
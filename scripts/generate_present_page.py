@@ -3,9 +3,18 @@
 
 Reads NAVI/offices/*/inbox and NAVI/packages/* manifests to build a clean
 HTML status page with Office cards, package lists and per-package file lists.
+
+Also importable: the mailroom runner calls generate() in-process and, when it
+already holds a snapshot, folds its routing results in with apply_routing()
+instead of re-scanning every inbox.
+
+Office cards are cached in NAVI/present/.fragments.json next to a fingerprint
+of their inbox directory, so a refresh only re-lists and re-renders offices
+whose inbox changed and splices the cached cards back into the page.
 """
 import json
 import os
+import time
 from datetime import datetime, timezone
 
 # Determine repo root from this script location
@@ -16,11 +25,28 @@ OFFICES_DIR = os.path.join(NAVI_ROOT, 'offices')
 PACKAGES_DIR = os.path.join(NAVI_ROOT, 'packages')
 PRESENT_DIR = os.path.join(NAVI_ROOT, 'present')
 
-os.makedirs(PRESENT_DIR, exist_ok=True)
+FRAGMENTS_FILENAME = '.fragments.json'
+FRAGMENTS_VERSION = 1
+# An inbox modified this close to when its card was cached may change again
+# within the same mtime tick, so such cards are never trusted (as git does
+# with "racily clean" index entries).
+RACY_NS = 2 * 10**9
+
+# present dir -> {office: fragment}; saves re-reading the fragment file in
+# long-running callers
+_fragments = {}
 
 
-def load_package_manifest(pkg_name):
-    path = os.path.join(PACKAGES_DIR, pkg_name, 'manifest.json')
+def _dirs(navi_root=None):
+    """(offices, packages, present) dirs for navi_root, or this repo's NAVI."""
+    if navi_root is None:
+        return OFFICES_DIR, PACKAGES_DIR, PRESENT_DIR
+    return (os.path.join(navi_root, 'offices'), os.path.join(navi_root, 'packages'),
+            os.path.join(navi_root, 'present'))
+
+
+def load_package_manifest(pkg_name, navi_root=None):
+    path = os.path.join(_dirs(navi_root)[1], pkg_name, 'manifest.json')
     if os.path.exists(path):
         try:
             with open(path, 'r', encoding='utf-8') as f:
@@ -30,8 +56,8 @@ def load_package_manifest(pkg_name):
     return None
 
 
-def list_office_inbox(office):
-    inbox = os.path.join(OFFICES_DIR, office, 'inbox')
+def list_office_inbox(office, navi_root=None):
+    inbox = os.path.join(_dirs(navi_root)[0], office, 'inbox')
     if not os.path.exists(inbox):
         return {'packages': [], 'files': []}
     entries = os.listdir(inbox)
@@ -46,35 +72,144 @@ def list_office_inbox(office):
     return {'packages': packages, 'files': files}
 
 
-def build_snapshot():
-    offices = {}
-    if not os.path.exists(OFFICES_DIR):
-        return offices
-    for office in sorted(os.listdir(OFFICES_DIR)):
-        office_path = os.path.join(OFFICES_DIR, office)
-        if not os.path.isdir(office_path):
+def package_files(office, pkg, navi_root=None):
+    manifest = load_package_manifest(pkg, navi_root)
+    if manifest and manifest.get('files'):
+        return [f['filename'] for f in manifest.get('files', [])]
+    # fallback: list files under inbox/<pkg>
+    pdir = os.path.join(_dirs(navi_root)[0], office, 'inbox', pkg)
+    files = []
+    if os.path.exists(pdir):
+        for root, _, fnames in os.walk(pdir):
+            for fn in fnames:
+                files.append(os.path.relpath(os.path.join(root, fn), pdir))
+    return files
+
+
+def office_data(office, navi_root=None):
+    data = list_office_inbox(office, navi_root)
+    # enrich package contents
+    pkg_items = [{'name': pkg, 'files': package_files(office, pkg, navi_root)} for pkg in data['packages']]
+    return {'packages': pkg_items, 'files': data['files']}
+
+
+def list_offices(navi_root=None):
+    offices_dir = _dirs(navi_root)[0]
+    if not os.path.exists(offices_dir):
+        return []
+    with os.scandir(offices_dir) as it:
+        return sorted(entry.name for entry in it if entry.is_dir())
+
+
+def build_snapshot(navi_root=None):
+    return {office: office_data(office, navi_root) for office in list_offices(navi_root)}
+
+
+def inbox_fingerprint(office, navi_root=None):
+    """
+    [mtime_ns, inode] of the office inbox directory, or None without one.
+
+    The directory mtime moves whenever an entry is added, removed or renamed,
+    which is everything a card shows; packages are delivered whole, so their
+    contents are not fingerprinted.
+    """
+    try:
+        st = os.stat(os.path.join(_dirs(navi_root)[0], office, 'inbox'))
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_ino]
+
+
+def load_fragments(navi_root=None):
+    present_dir = _dirs(navi_root)[2]
+    fragments = _fragments.get(present_dir)
+    if fragments is None:
+        fragments = {}
+        try:
+            with open(os.path.join(present_dir, FRAGMENTS_FILENAME), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') == FRAGMENTS_VERSION:
+                fragments = cached.get('offices', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+        _fragments[present_dir] = fragments
+    return fragments
+
+
+def save_fragments(fragments, navi_root=None):
+    present_dir = _dirs(navi_root)[2]
+    path = os.path.join(present_dir, FRAGMENTS_FILENAME)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': FRAGMENTS_VERSION, 'offices': fragments}, f)
+    os.replace(tmp, path)
+
+
+def _fragment(office, data, fingerprint, taken_ns):
+    return {'fingerprint': fingerprint, 'taken_ns': taken_ns, 'data': data,
+            'html': render_office_card(office, data)}
+
+
+def _is_fresh(fragment, fingerprint):
+    return (fragment is not None and fingerprint is not None
+            and fragment.get('fingerprint') == fingerprint
+            and fingerprint[0] < fragment.get('taken_ns', 0) - RACY_NS)
+
+
+def apply_routing(snapshot, routing_summary=None, packages=None, navi_root=None):
+    """
+    Fold one mailroom run into an existing snapshot without re-walking inboxes.
+
+    routing_summary is the runner's office -> [filenames] map and packages
+    its delivered package names (OFFICE_BATCH-...). Delivered sidecars are
+    picked up with one existence check per routed file.
+    """
+    offices_dir = _dirs(navi_root)[0]
+    for office, names in (routing_summary or {}).items():
+        data = snapshot.setdefault(office, {'packages': [], 'files': []})
+        files = set(data['files'])
+        for name in names:
+            files.add(name)
+            if os.path.exists(os.path.join(offices_dir, office, 'inbox', name + '.navi.json')):
+                files.add(name + '.navi.json')
+        data['files'] = sorted(files)
+    for pkg in packages or []:
+        office = pkg.split('_BATCH-')[0]
+        data = snapshot.setdefault(office, {'packages': [], 'files': []})
+        if any(p['name'] == pkg for p in data['packages']):
             continue
-        data = list_office_inbox(office)
-        # enrich package contents
-        pkg_items = []
-        for pkg in data['packages']:
-            manifest = load_package_manifest(pkg)
-            if manifest and manifest.get('files'):
-                files = [f['filename'] for f in manifest.get('files', [])]
-            else:
-                # fallback: list files under inbox/<pkg>
-                pdir = os.path.join(OFFICES_DIR, office, 'inbox', pkg)
-                files = []
-                if os.path.exists(pdir):
-                    for root, _, fnames in os.walk(pdir):
-                        for fn in fnames:
-                            files.append(os.path.relpath(os.path.join(root, fn), pdir))
-            pkg_items.append({'name': pkg, 'files': files})
-        offices[office] = {'packages': pkg_items, 'files': data['files']}
-    return offices
-
-
-def render_html(snapshot):
+        data['packages'].append({'name': pkg, 'files': package_files(office, pkg, navi_root)})
+        data['packages'].sort(key=lambda p: p['name'])
+    return snapshot
+
+
+def render_office_card(office, data):
+    pkg_count = len(data['packages'])
+    file_count = len(data['files']) + sum(len(p['files']) for p in data['packages'])
+    html_parts = []
+    html_parts.append('<div class="card">')
+    html_parts.append(f'<h3>{office}</h3>')
+    html_parts.append(f'<div class="small">Packages: {pkg_count} · Files: {file_count}</div>')
+    if pkg_count > 0:
+        html_parts.append('<div class="pkg">')
+        for p in data['packages']:
+            html_parts.append(f'<div><b>{p["name"]}</b>')
+            html_parts.append('<ul>')
+            for fn in p['files']:
+                html_parts.append(f'<li>{fn}</li>')
+            html_parts.append('</ul></div>')
+        html_parts.append('</div>')
+    if data['files']:
+        html_parts.append('<div class="pkg"><b>Inbox files</b><ul>')
+        for fn in data['files']:
+            html_parts.append(f'<li>{fn}</li>')
+        html_parts.append('</ul></div>')
+    html_parts.append('</div>')
+    return '\n'.join(html_parts)
+
+
+def render_html(snapshot, cards=None):
+    """Render the page; cards are pre-rendered office cards in office order."""
     updated = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
     total_packages = sum(len(v['packages']) for v in snapshot.values())
     total_files = sum(len(v['files']) for v in snapshot.values()) + sum(len(p['files']) for v in snapshot.values() for p in v['packages'])
@@ -92,27 +227,9 @@ def render_html(snapshot):
     html_parts.append(f'<div class="header"><h1>NAVI — Batch Overview</h1><div class="small">Last updated: {updated}<br/>Packages: {total_packages} · Files: {total_files}</div></div>')
 
     html_parts.append('<div class="grid">')
-    for office, data in sorted(snapshot.items()):
-        pkg_count = len(data['packages'])
-        file_count = len(data['files']) + sum(len(p['files']) for p in data['packages'])
-        html_parts.append('<div class="card">')
-        html_parts.append(f'<h3>{office}</h3>')
-        html_parts.append(f'<div class="small">Packages: {pkg_count} · Files: {file_count}</div>')
-        if pkg_count > 0:
-            html_parts.append('<div class="pkg">')
-            for p in data['packages']:
-                html_parts.append(f'<div><b>{p["name"]}</b>')
-                html_parts.append('<ul>')
-                for fn in p['files']:
-                    html_parts.append(f'<li>{fn}</li>')
-                html_parts.append('</ul></div>')
-            html_parts.append('</div>')
-        if data['files']:
-            html_parts.append('<div class="pkg"><b>Inbox files</b><ul>')
-            for fn in data['files']:
-                html_parts.append(f'<li>{fn}</li>')
-            html_parts.append('</ul></div>')
-        html_parts.append('</div>')
+    if cards is None:
+        cards = [render_office_card(office, data) for office, data in sorted(snapshot.items())]
+    html_parts.extend(cards)
     html_parts.append('</div>')
 
     # review section
@@ -123,13 +240,58 @@ def render_html(snapshot):
     return '\n'.join(html_parts)
 
 
-if __name__ == '__main__':
-    snapshot = build_snapshot()
-    html = render_html(snapshot)
-    out_path = os.path.join(PRESENT_DIR, 'index.html')
+def write_present(snapshot, navi_root=None, cards=None):
+    """Write index.html and present.json; returns the index.html path."""
+    present_dir = _dirs(navi_root)[2]
+    os.makedirs(present_dir, exist_ok=True)
+    html = render_html(snapshot, cards)
+    out_path = os.path.join(present_dir, 'index.html')
     with open(out_path, 'w', encoding='utf-8') as f:
         f.write(html)
-    json_path = os.path.join(PRESENT_DIR, 'present.json')
+    json_path = os.path.join(present_dir, 'present.json')
     with open(json_path, 'w', encoding='utf-8') as f:
         json.dump(snapshot, f, indent=2)
+    return out_path
+
+
+def generate(navi_root=None, snapshot=None, routing_summary=None, packages=None, stats=None):
+    """
+    Refresh the present page and return (out_path, snapshot).
+
+    Without a snapshot only offices whose inbox fingerprint changed are
+    re-listed; with one (kept by a long-running caller) the routing results
+    are applied to it instead. Either way only the touched office cards are
+    re-rendered. stats['rerendered'] receives their names.
+    """
+    fragments = load_fragments(navi_root)
+    taken_ns = time.time_ns()
+    rerendered = []
+    if snapshot is None:
+        snapshot = {}
+        for office in list_offices(navi_root):
+            fingerprint = inbox_fingerprint(office, navi_root)
+            fragment = fragments.get(office)
+            if not _is_fresh(fragment, fingerprint):
+                fragment = fragments[office] = _fragment(office, office_data(office, navi_root), fingerprint, taken_ns)
+                rerendered.append(office)
+            snapshot[office] = fragment['data']
+    else:
+        apply_routing(snapshot, routing_summary, packages, navi_root)
+        touched = set(routing_summary or {}) | {pkg.split('_BATCH-')[0] for pkg in packages or []}
+        for office in sorted(snapshot):
+            if office in touched or office not in fragments:
+                fragments[office] = _fragment(office, snapshot[office], inbox_fingerprint(office, navi_root), taken_ns)
+                rerendered.append(office)
+    for office in set(fragments) - set(snapshot):
+        del fragments[office]
+
+    out_path = write_present(snapshot, navi_root, [fragments[office]['html'] for office in sorted(snapshot)])
+    save_fragments(fragments, navi_root)
+    if stats is not None:
+        stats['rerendered'] = rerendered
+    return out_path, snapshot
+
+
+if __name__ == '__main__':
+    out_path, _ = generate()
     print(out_path)